@@ -587,11 +587,12 @@ def run_two_player_game_online(
 
     # Place ships (skip if already placed)
     t1 = threading.Thread(target=place_ships_for_player, args=(board1, rfile1, wfile1, 1, wfile2, placed1))
-    t2 = threading.Thread(target=place_ships_for_player, args=(board2, rfile2, wfile2, 2, wfile1, placed2))
     t1.start()
-    t2.start()
-    t1.join()
-    t2.join()
+    try:
+        # Player 2 places on the game's own thread, so only one helper thread is needed
+        place_ships_for_player(board2, rfile2, wfile2, 2, wfile1, placed2)
+    finally:
+        t1.join()
 
     # Only mark placement as done if all ships are placed
     placed1 = len(board1.placed_ships) == len(SHIPS)
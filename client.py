@@ -10,52 +10,50 @@ TODO: Fix the message synchronization issue using concurrency (Tier 1, item 1).
 import socket
 import threading
 import time
-from protocol import build_packet, parse_packet, PKT_TYPE_GAME, PKT_TYPE_CHAT
-import struct
+from collections import deque
+from protocol import (
+    build_packet, open_packet_body, PKT_TYPE_GAME, PKT_TYPE_CHAT,
+    HEADER_STRUCT, HEADER_SIZE, CHECKSUM_STRUCT, CHECKSUM_SIZE,
+)
 
 HOST = '127.0.0.1'
 PORT = 5000
 running = True
-messages = []
+messages = deque()  # appended by receive_messages, drained from the left by display_messages
+
+# Largest packet the 16-bit length field allows; each connection reuses one buffer this size
+MAX_PACKET_SIZE = HEADER_SIZE + 0xFFFF + CHECKSUM_SIZE
 
 def send_packet(conn, seq, pkt_type, msg):
     payload = msg.encode('utf-8')
     packet = build_packet(seq, pkt_type, payload)
     conn.sendall(packet)
 
-def recv_packet(conn):
-    header_size = 7
-    header = b''
-    while len(header) < header_size:
-        chunk = conn.recv(header_size - len(header))
-        if not chunk:
-            raise ConnectionError("Server disconnected")
-        header += chunk
-    seq, pkt_type, length = struct.unpack("!IBH", header)
-    payload = b''
-    while len(payload) < length:
-        chunk = conn.recv(length - len(payload))
-        if not chunk:
-            raise ConnectionError("Server disconnected")
-        payload += chunk
-    checksum = b''
-    while len(checksum) < 4:
-        chunk = conn.recv(4 - len(checksum))
-        if not chunk:
+def _recv_exact(conn, view):
+    """Fill view completely from conn."""
+    while view:
+        n = conn.recv_into(view)
+        if not n:
             raise ConnectionError("Server disconnected")
-        checksum += chunk
-    packet = header + payload + checksum
+        view = view[n:]
+
+def recv_packet(conn, view):
+    """Read one packet from conn into view, a MAX_PACKET_SIZE buffer owned by that connection."""
+    _recv_exact(conn, view[:HEADER_SIZE])
+    seq, pkt_type, length = HEADER_STRUCT.unpack_from(view)
+    body_end = HEADER_SIZE + length
+    _recv_exact(conn, view[HEADER_SIZE:body_end + CHECKSUM_SIZE])
     try:
-        seq, pkt_type, payload = parse_packet(packet)
+        payload = open_packet_body(view[:body_end], CHECKSUM_STRUCT.unpack_from(view, body_end)[0])
         return seq, pkt_type, payload.decode('utf-8')
     except Exception as e:
         return None, None, None
 
-def receive_messages(conn):
+def receive_messages(conn, view):
     global messages, running
     while running:
         try:
-            s, pkt_type, line = recv_packet(conn)
+            s, pkt_type, line = recv_packet(conn, view)
             
 
 
@@ -78,7 +76,7 @@ def receive_messages(conn):
             if line == "MY_BOARD":
                 messages.append("\n[Your Board]")
                 while True:
-                    s, pkt_type, board_line = recv_packet(conn)
+                    s, pkt_type, board_line = recv_packet(conn, view)
                     if not board_line or board_line.strip() == "":
                         break
                     messages.append(board_line.strip())
@@ -86,7 +84,7 @@ def receive_messages(conn):
             if line == "GRID":
                 messages.append("\n[Board]")
                 while True:
-                    s, pkt_type, empty_line = recv_packet(conn)
+                    s, pkt_type, empty_line = recv_packet(conn, view)
                     if not empty_line or empty_line.strip() == "":
                         break
                     messages.append(empty_line.strip())
@@ -105,7 +103,7 @@ def receive_messages(conn):
 def display_messages():
     while running:
         while messages:
-            print(messages.pop(0))
+            print(messages.popleft())
         time.sleep(0.05)  # 防止 CPU 占用过高
 
             
@@ -121,24 +119,26 @@ def main():
             s.connect((HOST, PORT))
             seq_send = 0
             seq_recv = 0
+            # A reader left over from the last connection may still be in recv_packet, so never share its buffer
+            view = memoryview(bytearray(MAX_PACKET_SIZE))
 
             # Send username for identification
             send_packet(s, seq_send, PKT_TYPE_GAME, f"USERNAME {username}")
             seq_send += 1
 
             # Wait for initial server message
-            s_, pkt_type, initial_msg = recv_packet(s)
+            s_, pkt_type, initial_msg = recv_packet(s, view)
             if initial_msg:
                 print(initial_msg.strip())
 
             running = True
-            threading.Thread(target=receive_messages, args=(s,), daemon=True).start()
+            threading.Thread(target=receive_messages, args=(s, view), daemon=True).start()
             threading.Thread(target=display_messages, daemon=True).start()
 
             time.sleep(0.3)
-            for m in messages:
-                print(m)
-            messages.clear()
+            # Drain rather than iterate: receive_messages may append meanwhile, which a deque rejects
+            while messages:
+                print(messages.popleft())
 
             try:
                 # --- Always allow user input, even in lobby ---
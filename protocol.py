@@ -7,8 +7,10 @@ from cryptography.hazmat.backends import default_backend
 # | seq (4 bytes) | type (1 byte) | length (2 bytes) | nonce (16 bytes) | encrypted_payload (variable) | checksum (4 bytes) |
 
 HEADER_FORMAT = "!IBH"  # seq: uint32, type: uint8, length: uint16
-HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
-CHECKSUM_SIZE = 4
+HEADER_STRUCT = struct.Struct(HEADER_FORMAT)  # precompiled so the format isn't re-parsed per packet
+HEADER_SIZE = HEADER_STRUCT.size
+CHECKSUM_STRUCT = struct.Struct("!I")
+CHECKSUM_SIZE = CHECKSUM_STRUCT.size
 NONCE_SIZE = 16 # AES block size, common for CTR IV/nonce
 
 # --- Encryption Configuration ---
@@ -43,10 +45,23 @@ def build_packet(seq: int, pkt_type: int, payload: bytes) -> bytes:
     # The payload for the packet structure is now nonce + encrypted_payload
     full_payload = nonce + encrypted_payload
     
-    header = struct.pack(HEADER_FORMAT, seq, pkt_type, len(full_payload))
+    header = HEADER_STRUCT.pack(seq, pkt_type, len(full_payload))
     body = header + full_payload # Checksum is over header + nonce + encrypted_payload
     checksum = calc_checksum(body)
-    return body + struct.pack("!I", checksum)
+    return body + CHECKSUM_STRUCT.pack(checksum)
+
+def restamp_packet(packet: bytes, seq: int) -> bytes:
+    """
+    Return a copy of a built packet with a different sequence number. The checksum is a plain
+    byte sum, so it is adjusted by the change in the seq bytes instead of rebuilding the packet.
+    """
+    stamped = bytearray(packet)
+    HEADER_STRUCT.pack_into(stamped, 0, seq, stamped[4], HEADER_STRUCT.unpack_from(packet)[2])
+    body_end = len(stamped) - CHECKSUM_SIZE
+    checksum = CHECKSUM_STRUCT.unpack_from(stamped, body_end)[0]
+    checksum = (checksum - sum(packet[:4]) + sum(stamped[:4])) % (2**32)
+    CHECKSUM_STRUCT.pack_into(stamped, body_end, checksum)
+    return bytes(stamped)
 
 def parse_packet(packet: bytes):
     """Parse and verify a packet. Returns (seq, pkt_type, decrypted_payload) or raises ValueError."""
@@ -54,7 +69,7 @@ def parse_packet(packet: bytes):
         raise ValueError(f"Packet too short. Min length {HEADER_SIZE + NONCE_SIZE + CHECKSUM_SIZE}, got {len(packet)}")
     
     header = packet[:HEADER_SIZE]
-    seq, pkt_type, length = struct.unpack(HEADER_FORMAT, header)
+    seq, pkt_type, length = HEADER_STRUCT.unpack(header)
 
     # The length field refers to (nonce + encrypted_payload)
     if len(packet) < HEADER_SIZE + length + CHECKSUM_SIZE:
@@ -69,24 +84,30 @@ def parse_packet(packet: bytes):
         raise ValueError("Malformed packet: checksum length mismatch")
 
     body = header + full_payload_with_nonce # Checksum is calculated over header + nonce + encrypted_payload
-    expected_checksum = struct.unpack("!I", checksum_bytes)[0]
+    expected_checksum = CHECKSUM_STRUCT.unpack(checksum_bytes)[0]
+    return seq, pkt_type, open_packet_body(body, expected_checksum)
+
+def open_packet_body(body, expected_checksum: int) -> bytes:
+    """
+    Verify and decrypt a packet body (header + nonce + encrypted payload) whose header the
+    caller has already unpacked. body may be any bytes-like object, e.g. a memoryview over a
+    receive buffer. Returns the decrypted payload or raises ValueError.
+    """
     if calc_checksum(body) != expected_checksum:
         raise ValueError("Checksum mismatch")
 
     # Extract nonce and the actual encrypted payload
-    if len(full_payload_with_nonce) < NONCE_SIZE:
+    if len(body) < HEADER_SIZE + NONCE_SIZE:
         raise ValueError("Malformed packet: payload too short to contain nonce")
-        
-    nonce = full_payload_with_nonce[:NONCE_SIZE]
-    encrypted_original_payload = full_payload_with_nonce[NONCE_SIZE:]
-    
+
+    nonce = bytes(body[HEADER_SIZE : HEADER_SIZE + NONCE_SIZE])
+    encrypted_original_payload = body[HEADER_SIZE + NONCE_SIZE:]
+
     # Decrypt the original payload
     try:
-        decrypted_payload = _decrypt(SHARED_KEY, nonce, encrypted_original_payload)
+        return _decrypt(SHARED_KEY, nonce, encrypted_original_payload)
     except Exception as e: # Catch potential decryption errors
         raise ValueError(f"Decryption failed: {e}")
-        
-    return seq, pkt_type, decrypted_payload
 
 # Example usage:
 # pkt = build_packet(1, PKT_TYPE_CHAT, b"hayalin:hello world")
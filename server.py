@@ -10,22 +10,45 @@ The core issue is in how the client handles incoming messages.
 However, if you want to support multiple clients (i.e. progress through further Tiers), you'll need concurrency here too.
 """
 
+import errno
 import socket
+import sys
 import threading
 import time
 import queue
-import struct
-import select  # Add this import
+import logging
+import logging.handlers
+import selectors
+import signal
+import weakref
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 from battleship import run_single_player_game_online, run_two_player_game_online, Board, BOARD_SIZE, SHIPS
-from protocol import build_packet, parse_packet, PKT_TYPE_GAME, PKT_TYPE_CHAT
+from protocol import (
+    build_packet, restamp_packet, open_packet_body, PKT_TYPE_GAME, PKT_TYPE_CHAT,
+    HEADER_STRUCT, HEADER_SIZE, CHECKSUM_STRUCT, CHECKSUM_SIZE,
+)
 
 HOST = '127.0.0.1'
 PORT = 5000
 
-waiting_lines = []
+logger = logging.getLogger("battleship")
+
+waiting_lines = OrderedDict()  # username -> (conn, addr), in queue order
 waiting_players_lock = threading.Lock() # a lock to thread for needing 2 players to start the game
-game_lock = threading.Lock()
+waiting_players_cv = threading.Condition(waiting_players_lock) # notified when waiting_lines or game_running changes
 game_running = threading.Event()
+server_stopping = threading.Event()  # set by main on shutdown; lobby_manager stops starting matches
+
+# --- Lobby reactor: one thread reads chat from every waiting player ---
+lobby_selector = selectors.DefaultSelector()  # epoll on Linux; key.data is (username, addr, original SO_SNDBUF)
+lobby_io_lock = threading.Lock()  # held while the reactor reads, so a socket is never read after leaving the lobby
+# Lobby traffic is status and chat where only the latest matters, so a small send buffer makes a
+# slow client miss updates instead of queueing stale ones. Games get back the size the socket had
+# on entering the lobby, but setting SO_SNDBUF at all pins it: Linux never autotunes it again.
+LOBBY_SNDBUF = 4096
+_SNDBUF_REPORT_SCALE = 2 if sys.platform.startswith("linux") else 1  # Linux reports double the size it was set to
 
 # Add player_sessions to track username -> session info
 player_sessions = {}  # username: { 'conn': ..., 'addr': ..., 'game': ..., 'last_active': ..., 'reconnect_token': ..., ... }
@@ -33,581 +56,429 @@ player_sessions_lock = threading.Lock()
 
 RECONNECT_TIMEOUT = 60  # seconds
 
-# --- NEW: Persistent game state storage ---
-games = {}  # (username1, username2): { 'board1': ..., 'board2': ..., 'turn': ..., 'ships1': ..., 'ships2': ..., 'placed1': ..., 'placed2': ... }
+# --- Admission control ---
+MAX_SESSIONS = 64    # client handlers running at once; extra clients are turned away
+MAX_LOBBY_SIZE = 32  # players allowed to queue in the two player lobby
+session_slots = threading.BoundedSemaphore(MAX_SESSIONS)
+# Admitted clients run on a fixed pool; session_slots keeps submissions within its size
+client_executor = ThreadPoolExecutor(max_workers=MAX_SESSIONS, thread_name_prefix="client")
+# Handler threads only run shallow game loops, so the default 8 MiB stack reservation is mostly waste
+THREAD_STACK_SIZE = 512 * 1024
+HANDSHAKE_TIMEOUT = 10  # seconds a new connection gets to send its USERNAME packet
+MATCH_COUNTDOWN = 5.0  # seconds between announcing the next match and starting it
+ACCEPT_BACKOFF = 0.1  # seconds to pause accepting while out of file descriptors
+_ACCEPT_RETRY = {errno.ECONNABORTED, errno.EINTR, errno.EAGAIN, errno.EPROTO}  # this connection only
+_ACCEPT_EXHAUSTED = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM}  # resources; back off
 
-active_connections = []
+# --- NEW: Persistent game state storage ---
+games_lock = threading.Lock()  # guards the games dict itself; always the innermost lock taken
+# Game loops run on pooled threads so back-to-back matches reuse them instead of spawning new ones
+game_executor = ThreadPoolExecutor(max_workers=MAX_SESSIONS // 2, thread_name_prefix="game")
+game_terminators = set()  # terminate_game of every running match, so shutdown can wake their game threads
+game_terminators_lock = threading.Lock()
+# Supervisors for matches started by lobby_manager; separate so they never wait behind client handlers
+supervisor_executor = ThreadPoolExecutor(max_workers=MAX_SESSIONS // 2, thread_name_prefix="supervisor")
+GAME_STOP_TIMEOUT = 5  # seconds to wait for a terminated game thread to let go of its sockets
+games = {}  # (username1, username2): GameState
+
+# Sockets that receive chat. Copy-on-write: writers swap in a new frozenset under the lock,
+# so the broadcaster reads the current set without locking.
+active_connections = frozenset()
 active_connections_lock = threading.Lock()
+chat_queue = queue.Queue()  # (sender_username, message) pairs waiting for chat_broadcaster
+CHAT_BATCH_MAX = 64  # queued chat messages coalesced into one send per connection
+dead_connections = queue.SimpleQueue()  # sockets found dead, dropped from active_connections by connection_sweeper
 
 # Add single player game states dictionary
 single_player_games = {}  # username: {'board': board, 'ships_placed': bool, 'game_started': bool}
 single_player_games_lock = threading.Lock()
 
-def send_packet(conn, seq, pkt_type, msg):
-    """Send a packet with the given sequence, type, and string payload."""
-    payload = msg.encode('utf-8')
-    packet = build_packet(seq, pkt_type, payload)
-    conn.sendall(packet)
-
-def recv_packet(conn):
-    """Receive a packet and return (seq, pkt_type, payload as str)."""
-    # Read header first to get payload length
-    header_size = 7  # 4+1+2
-    header = b''
-    while len(header) < header_size:
-        chunk = conn.recv(header_size - len(header))
-        if not chunk:
-            raise ConnectionError("Client disconnected")
-        header += chunk
-    seq, pkt_type, length = struct.unpack("!IBH", header)
-    payload = b''
-    while len(payload) < length:
-        chunk = conn.recv(length - len(payload))
-        if not chunk:
-            raise ConnectionError("Client disconnected")
-        payload += chunk
-    checksum = b''
-    while len(checksum) < 4:
-        chunk = conn.recv(4 - len(checksum))
-        if not chunk:
-            raise ConnectionError("Client disconnected")
-        checksum += chunk
-    packet = header + payload + checksum
-    try:
-        seq, pkt_type, payload = parse_packet(packet)
-        return seq, pkt_type, payload.decode('utf-8')
-    except Exception as e:
-        # Optionally log or handle checksum error
-        return None, None, None
-
-def handle_initial_connection(conn, addr):
+# Sent as the first packet (seq 0) of every game. The nonce is reused, but the plaintext
+# is identical each time, so the repeated ciphertext reveals nothing new.
+INSTRUCTION = (
+    "INSTRUCTION: To place a ship, type: place <start_coord> <orientation> <ship_name>\n"
+    "Example: place b6 v carrier\n"
+)
+INSTRUCTION_PACKET = build_packet(0, PKT_TYPE_GAME, INSTRUCTION.encode('utf-8'))
+
+RECV_CHUNK = 65536  # bytes asked of the kernel per recv, so a burst of packets costs one call
+_recv_buffers = threading.local()  # one reusable recv_into scratch buffer per thread
+_rx_buffers = weakref.WeakKeyDictionary()  # conn -> received bytes not yet returned as packets
+_rx_buffers_lock = threading.Lock()
+
+# --- Static server messages, encoded once at import ---
+MSG_BAD_HANDSHAKE = b"ERROR: Must provide USERNAME <name> as first message."
+MSG_EMPTY_USERNAME = b"ERROR: Username cannot be empty."
+MSG_WELCOME = b"WELCOME! Waiting for game to start..."
+MSG_SERVER_FULL = b"ERROR: Server is full. Please try again later."
+MSG_LOBBY_FULL = b"ERROR: The lobby is full. Please try again later."
+MSG_GAME_IN_PROGRESS = b"A game is currently in progress. You are in the lobby and will join the next game when it starts."
+MSG_WAITING_FOR_PLAYER = b"Waiting for another player to join..."
+MSG_CHAT_HINT = b"You can chat with 'chat <message>'."
+MSG_LOBBY_CHAT_REMINDER = b"[LOBBY] Remember: You can chat with other players using 'chat <message>'"
+LOBBY_NEXT_MATCH = "[LOBBY] Next match: {winner} (last game winner) vs {opponent}. The match will begin in FIVE SECONDS."
+LOBBY_AWAITING_OPPONENT = (
+    "[LOBBY] Next match: {winner} (last game winner) awaiting an opponent. "
+    "The match will begin when another player joins."
+)
+LOBBY_EMPTY = "[LOBBY] Waiting for players to join for the next match."
+
+# Messages always sent as seq 0 are framed once too, and go out with a single send
+PKT_SERVER_FULL = build_packet(0, PKT_TYPE_GAME, MSG_SERVER_FULL)
+PKT_LOBBY_FULL = build_packet(0, PKT_TYPE_GAME, MSG_LOBBY_FULL)
+PKT_GAME_IN_PROGRESS = build_packet(0, PKT_TYPE_GAME, MSG_GAME_IN_PROGRESS)
+PKT_WAITING_FOR_PLAYER = build_packet(0, PKT_TYPE_GAME, MSG_WAITING_FOR_PLAYER)
+PKT_CHAT_HINT = build_packet(0, PKT_TYPE_GAME, MSG_CHAT_HINT)
+PKT_OPPONENT_TIMEOUT = build_packet(0, PKT_TYPE_GAME, b"OPPONENT_TIMEOUT. You win!")
+PKT_OPPONENT_DISCONNECTED = build_packet(
+    0, PKT_TYPE_GAME, b"INFO: Opponent disconnected. Waiting up to 60 seconds for them to reconnect...")
+PKT_YOU_DISCONNECTED = build_packet(
+    0, PKT_TYPE_GAME, b"INFO: You have been disconnected. If you reconnect within 60 seconds, you can resume the game.")
+# Templates for fixed messages sent with a varying seq; restamp_packet patches in the real one
+PKT_BAD_HANDSHAKE = build_packet(0, PKT_TYPE_GAME, MSG_BAD_HANDSHAKE)
+PKT_EMPTY_USERNAME = build_packet(0, PKT_TYPE_GAME, MSG_EMPTY_USERNAME)
+PKT_WELCOME = build_packet(0, PKT_TYPE_GAME, MSG_WELCOME)
+PKT_LOBBY_CHAT_REMINDER = build_packet(0, PKT_TYPE_GAME, MSG_LOBBY_CHAT_REMINDER)
+
+def frame_packet(seq, pkt_type, msg):
+    """Build the wire bytes for a packet whose payload is a str or pre-encoded bytes."""
+    payload = msg if isinstance(msg, bytes) else msg.encode('utf-8')
+    return build_packet(seq, pkt_type, payload)
+
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)  # Not on Windows, where the send may block
+SEND_STALL_TIMEOUT = 5  # seconds to wait for room to finish a packet before giving up on the peer
+_send_locks = weakref.WeakKeyDictionary()  # conn -> RLock held for each whole packet written to it
+_send_locks_lock = threading.Lock()
+
+def conn_send_lock(conn):
     """
-    Handles the initial handshake to get the username.
-    Returns (username, conn, addr) or (None, None, None) on failure.
+    The lock every writer holds while sending one packet on conn. Chat, lobby status and
+    game output come from different threads, and a packet sent in pieces must not be split.
     """
-    try:
-        seq = 0
-        seq_recv = 0
-        # Receive USERNAME packet
-        seq_recv, pkt_type, payload = recv_packet(conn)
-        if pkt_type != PKT_TYPE_GAME or not payload.startswith("USERNAME "):
-            send_packet(conn, seq, PKT_TYPE_GAME, "ERROR: Must provide USERNAME <name> as first message.")
-            conn.close()
-            return None, None, None
-        username = payload.strip().split(" ", 1)[1]
-        if not username:
-            send_packet(conn, seq, PKT_TYPE_GAME, "ERROR: Username cannot be empty.")
-            conn.close()
-            return None, None, None
-        print(f"[EVENT] Received username: {username} from {addr}")
-        # --- Send a protocol welcome/lobby message immediately after handshake ---
-        send_packet(conn, seq+1, PKT_TYPE_GAME, "WELCOME! Waiting for game to start...")
-        return username, conn, addr
-    except Exception as e:
-        print(f"[EVENT] Exception in handle_initial_connection: {e}")
-        try: conn.close()
-        except: pass
-        return None, None, None
+    with _send_locks_lock:
+        lock = _send_locks.get(conn)
+        if lock is None:
+            lock = _send_locks[conn] = threading.RLock()
+        return lock
 
-def wait_for_reconnect(username, old_session, mode):
+def _finish_send(conn, view):
     """
-    Waits up to RECONNECT_TIMEOUT seconds for the player to reconnect.
-    Returns new (conn, addr) if reconnected, else None.
+    Write the rest of a partly sent packet so the stream stays framed. Works on the
+    non-blocking lobby sockets too, where sendall would give up mid-packet.
     """
-    start_time = time.time()
-    while time.time() - start_time < RECONNECT_TIMEOUT:
-        with player_sessions_lock:
-            session = player_sessions.get(username)
-            if session and session.get('reconnected'):
-                # Got a new connection
-                conn = session['conn']
-                addr = session['addr']
-                session['reconnected'] = False  # Reset for future disconnects
-                return conn, addr
-        time.sleep(0.5)
-    return None, None
-
-def single_player(conn, addr, username):
-    try:
-        seq_send = 0
-        seq_recv = 0
-        print(f"[EVENT] Starting single player game for {addr}")
-
-        def send(msg):
-            nonlocal seq_send
-            send_packet(conn, seq_send, PKT_TYPE_GAME, msg)
-            seq_send += 1
-
-        def recv():
-            nonlocal seq_recv
-            s, pkt_type, payload = recv_packet_handle_chat(conn, username)
-            seq_recv = s
-            return payload
-
-        # Add instruction for ship placement
-        instruction = (
-            "INSTRUCTION: To place a ship, type: place <start_coord> <orientation> <ship_name>\n"
-            "Example: place b6 v carrier\n"
-        )
-        send(instruction)
-
-        class WFileWrapper:
-            def write(self, msg):
-                send(msg)
-            def flush(self):
-                pass
-
-        class RFileWrapper:
-            def readline(self):
-                return recv()
-
-        # Check if we have a saved game state for this player
-        restored_game = False
-        board = None
-        with single_player_games_lock:
-            if username in single_player_games:
-                game_state = single_player_games[username]
-                if game_state.get('game_started', False):
-                    board = game_state.get('board')
-                    ships_placed = game_state.get('ships_placed', False)
-                    restored_game = True
-                    print(f"[INFO] Restoring saved game for {username}")
-                    # Send game restoration message to client
-                    send("GAME_RESTORED: Your previous game state has been restored.")
-                    if ships_placed:
-                        send("SHIPS_PLACED: Your ships have been restored to their previous positions.")
-                    else:
-                        send("SHIPS_NOT_PLACED: You need to place your ships.")
-
-        # Define a hook to save the game state during gameplay
-        def save_state_hook(board, ships_placed, game_started):
-            with single_player_games_lock:
-                single_player_games[username] = {
-                    'board': board,
-                    'ships_placed': ships_placed,
-                    'game_started': game_started,
-                    'last_updated': time.time()
-                }
-            print(f"[INFO] Saved game state for {username}")
-
-        # Run the game with the restored board if available
-        run_single_player_game_online(RFileWrapper(), WFileWrapper(), board=board, save_state_hook=save_state_hook)
-        print(f"[EVENT] Finished single player game for {addr}")
-        
-        # If game completed successfully, clean up the saved state
-        with single_player_games_lock:
-            if username in single_player_games:
-                del single_player_games[username]
-                print(f"[INFO] Removed completed game state for {username}")
-                
-    except Exception as e:
-        print(f"[WARN] Single player client {addr} ({username}) disconnected: {e}")
-        # Wait for reconnection
-        with player_sessions_lock:
-            player_sessions[username]['disconnected'] = True
-        print(f"[INFO] Waiting {RECONNECT_TIMEOUT}s for {username} to reconnect...")
-        new_conn, new_addr = wait_for_reconnect(username, player_sessions[username], mode="1")
-        if new_conn:
-            print(f"[INFO] {username} reconnected from {new_addr}. Resuming game.")
-
-            single_player(new_conn, new_addr, username)
-        else:
-            print(f"[INFO] {username} did not reconnect in time. Forfeiting game.")
-    finally:
-        conn.close()
-        print(f"[INFO] Single player client {addr} ({username}) connection closed.")
-
-def two_player_game(conn1, addr1, conn2, addr2, username1, username2):
-    global game_running
-    winner_conn = None
-    winner_addr = None
-    last_winner_addr = None
-    game_key = tuple(sorted([username1, username2]))
-    try:
-        # --- NEW: Mark both players as connected in game state ---
-        game_state = games.get(game_key)
-        if not game_state:
-            board1 = Board(BOARD_SIZE)
-            board2 = Board(BOARD_SIZE)
-            turn = 0
-            placed1 = False
-            placed2 = False
-            games[game_key] = {
-                'board1': board1,
-                'board2': board2,
-                'turn': turn,
-                'placed1': placed1,
-                'placed2': placed2,
-                'connected': {username1: True, username2: True},
-                'conns': {username1: conn1, username2: conn2},
-                'addrs': {username1: addr1, username2: addr2},
-                'waiting_reconnect': False,
-                'last_disconnect_time': None
-            }
-        else:
-            board1 = game_state['board1']
-            board2 = game_state['board2']
-            turn = game_state['turn']
-            placed1 = game_state.get('placed1', False)
-            placed2 = game_state.get('placed2', False)
-            game_state['connected'][username1] = True
-            game_state['connected'][username2] = True
-            game_state['conns'][username1] = conn1
-            game_state['conns'][username2] = conn2
-            game_state['addrs'][username1] = addr1
-            game_state['addrs'][username2] = addr2
-            game_state['waiting_reconnect'] = False
-            game_state['last_disconnect_time'] = None
-
-        seq_send1 = 0
-        seq_recv1 = 0
-        seq_send2 = 0
-        seq_recv2 = 0
-
-        def send1(msg):
-            nonlocal seq_send1
-            send_packet(conn1, seq_send1, PKT_TYPE_GAME, msg)
-            seq_send1 += 1
-
-        def send2(msg):
-            nonlocal seq_send2
-            send_packet(conn2, seq_send2, PKT_TYPE_GAME, msg)
-            seq_send2 += 1
-
-        def recv1():
-            nonlocal seq_recv1
-            s, pkt_type, payload = recv_packet_handle_chat(conn1, username1)
-            seq_recv1 = s
-            return payload
-
-        def recv2():
-            nonlocal seq_recv2
-            s, pkt_type, payload = recv_packet_handle_chat(conn2, username2)
-            seq_recv2 = s
-            return payload
-
-        class WFileWrapper1:
-            def write(self, msg):
-                send1(msg)
-            def flush(self):
-                pass
-
-        class WFileWrapper2:
-            def write(self, msg):
-                send2(msg)
-            def flush(self):
-                pass
-
-        class RFileWrapper1:
-            def readline(self):
-                return recv1()
-
-        class RFileWrapper2:
-            def readline(self):
-                return recv2()
-
-        print(f"[EVENT] Starting two player game for {addr1} and {addr2}")
-        instruction = (
-            "INSTRUCTION: To place a ship, type: place <start_coord> <orientation> <ship_name>\n"
-            "Example: place b6 v carrier\n"
-        )
-        send1(instruction)
-        send2(instruction)
-        def lobby_broadcast(msg):
-            with waiting_players_lock:
-                for c, a, u in waiting_lines:
-                    try:
-                        lobby_wfile = c.makefile('w')
-                        lobby_wfile.write(msg + "\n")
-                        lobby_wfile.flush()
-                    except Exception:
-                        pass
-        with player_sessions_lock:
-            player_sessions[username1]['in_game'] = True
-            player_sessions[username2]['in_game'] = True
-        game_running.set()
-
-        # --- Game state restoration logic ---
-        game_state = games.get(game_key)
-        if not game_state:
-            # New game state
-            board1 = Board(BOARD_SIZE)
-            board2 = Board(BOARD_SIZE)
-            turn = 0
-            placed1 = False
-            placed2 = False
-            games[game_key] = {
-                'board1': board1,
-                'board2': board2,
-                'turn': turn,
-                'placed1': placed1,
-                'placed2': placed2
-            }
-        else:
-            board1 = game_state['board1']
-            board2 = game_state['board2']
-            turn = game_state['turn']
-            placed1 = game_state.get('placed1', False)
-            placed2 = game_state.get('placed2', False)
-
-        # Pass state to battleship logic
-        def save_state_hook(board1, board2, turn, placed1, placed2):
-            games[game_key]['board1'] = board1
-            games[game_key]['board2'] = board2
-            games[game_key]['turn'] = turn
-            games[game_key]['placed1'] = placed1
-            games[game_key]['placed2'] = placed2
-
-        # --- NEW: Wrap run_two_player_game_online to handle disconnects and reconnections ---
-        def player_disconnected_callback(username):
-            game_state = games.get(game_key)
-            if game_state:
-                game_state['connected'][username] = False
-                # --- Set waiting_reconnect immediately on disconnect ---
-                game_state['waiting_reconnect'] = True
-                game_state['last_disconnect_time'] = time.time()
-
-        def send_info_to_players(disconnected, connected, game_state):
-            try:
-                if disconnected and connected:
-                    loser = disconnected[0]
-                    winner = connected[0]
-                    loser_conn = game_state['conns'][loser]
-                    winner_conn = game_state['conns'][winner]
-                    winner_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"INFO: Opponent disconnected. Waiting up to 60 seconds for them to reconnect..."))
+    while view:
+        try:
+            # MSG_DONTWAIT so a blocking in-game socket also times out here instead of blocking forever
+            view = view[conn.send(view, _MSG_DONTWAIT):]
+        except BlockingIOError:
+            # Rare, so a throwaway selector is fine; unlike select.select it has no fd limit
+            with selectors.DefaultSelector() as sel:
+                sel.register(conn, selectors.EVENT_WRITE)
+                if not sel.select(SEND_STALL_TIMEOUT):
+                    # Part of the packet is already out, so the stream can never be framed again.
+                    # Shutting down makes the lobby reactor or game reader drop the player.
                     try:
-                        loser_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"INFO: You have been disconnected. If you reconnect within 60 seconds, you can resume the game."))
-                    except Exception:
+                        conn.shutdown(socket.SHUT_RDWR)
+                    except OSError:
                         pass
-            except Exception:
-                pass
-
-        # --- NEW: Use a dedicated function to run the game logic ---
-        def run_game():
-            run_two_player_game_online(
-                RFileWrapper1(), WFileWrapper1(),
-                RFileWrapper2(), WFileWrapper2(),
-                lobby_broadcast=lobby_broadcast,
-                usernames=(username1, username2),
-                board1=board1,
-                board2=board2,
-                turn=turn,
-                placed1=placed1,
-                placed2=placed2,
-                save_state_hook=save_state_hook,
-                player_disconnected_callback=player_disconnected_callback
-            )
-
-        game_thread = threading.Thread(target=run_game)
-        game_thread.start()
-
-        # --- Monitor disconnects while the game is running ---
-        game_state = games.get(game_key)
-        disconnect_timeout_started = False
-        disconnect_start_time = None
-        disconnected_user = None
-        connected_user = None
+                    raise ConnectionError("Peer stopped reading mid-packet")
 
-        while True:
-            if not game_thread.is_alive():
-                break
-            if game_state:
-                disconnected = [u for u, c in game_state['connected'].items() if not c]
-                connected = [u for u, c in game_state['connected'].items() if c]
-                # Start timeout as soon as one player disconnects
-                if not disconnect_timeout_started and len(disconnected) == 1 and len(connected) == 1:
-                    disconnect_timeout_started = True
-                    disconnect_start_time = time.time()
-                    disconnected_user = disconnected[0]
-                    connected_user = connected[0]
-                    print(f"[INFO] Waiting 60s for {disconnected_user} to reconnect...")
-                    send_info_to_players([disconnected_user], [connected_user], game_state)
-                # If timeout started, check for reconnect or timeout expiry
-                if disconnect_timeout_started:
-                    # If both disconnected, break immediately
-                    if len(connected) == 0 and len(disconnected) == 2:
-                        print(f"[INFO] Both players at {addr1} and {addr2} QUIT or disconnected during the game or ship placement.")
-                        break
-                    # If reconnected, resume game
-                    if all(game_state['connected'].values()):
-                        print(f"[INFO] {', '.join(game_state['connected'].keys())} reconnected for game {game_key}.")
-                        print(f"[INFO] Both players reconnected for game {game_key}.")
-                        disconnect_timeout_started = False
-                        disconnect_start_time = None
-                        disconnected_user = None
-                        connected_user = None
-                    # If timeout expired, forfeit
-                    elif time.time() - disconnect_start_time >= RECONNECT_TIMEOUT:
-                        print(f"[INFO] {disconnected_user} did not reconnect in time. {connected_user} wins by forfeit.")
-                        try:
-                            winner_conn = game_state['conns'][connected_user]
-                            winner_addr = game_state['addrs'][connected_user]
-                            winner_username = connected_user
-                            winner_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"OPPONENT_TIMEOUT. You win!"))
-                        except Exception:
-                            winner_conn = None
-                            winner_addr = None
-                            winner_username = None
-                        # End the game and requeue the winner for next match
-                        game_state['waiting_reconnect'] = False
-                        del games[game_key]
-                        if winner_conn and winner_conn.fileno() != -1:
-                            with waiting_players_lock:
-                                if (winner_conn, winner_addr, winner_username) not in waiting_lines:
-                                    waiting_lines.insert(0, (winner_conn, winner_addr, winner_username))
-                        # --- Immediately break so lobby_manager can match the winner ---
-                        break
-            time.sleep(0.5)
+def send_bytes(conn, data):
+    """
+    Send data with one send() call; small packets almost always go out whole, so the
+    _finish_send loop only runs for the remainder of a short write.
+    """
+    with conn_send_lock(conn):
+        try:
+            sent = conn.send(data)
+        except BlockingIOError:
+            sent = 0  # Non-blocking lobby socket with a full buffer; wait for room below
+        if sent < len(data):
+            _finish_send(conn, memoryview(data)[sent:])
 
-        # --- Cleanup and lobby requeue logic ---
-    except Exception as e:
-        print(f"[ERROR] Exception during game: {e}")
-        # --- Remove immediate win/forfeit logic here ---
-        print(f"[INFO] Notified remaining player(s) of win and returning to lobby.")
+def try_send_bytes(conn, data):
+    """
+    Send data without waiting for socket buffer space. Returns False, having sent nothing,
+    if the peer's buffer is full or another thread is mid-packet on it. A partial write is
+    finished to keep packets framed.
+    """
+    lock = conn_send_lock(conn)
+    if not lock.acquire(blocking=False):
+        return False
+    try:
+        try:
+            sent = conn.send(data, _MSG_DONTWAIT)
+        except BlockingIOError:
+            return False
+        if sent < len(data):
+            _finish_send(conn, memoryview(data)[sent:])
+        return True
     finally:
-        with player_sessions_lock:
-            player_sessions[username1]['in_game'] = False
-            player_sessions[username2]['in_game'] = False
+        lock.release()
+
+def send_packet(conn, seq, pkt_type, msg):
+    """Send a packet with the given sequence, type, and payload (str, or pre-encoded bytes)."""
+    send_bytes(conn, frame_packet(seq, pkt_type, msg))
+
+# Keepalive probing starts after KEEPALIVE_IDLE idle seconds and gives up after
+# KEEPALIVE_COUNT unanswered probes KEEPALIVE_INTERVAL seconds apart.
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 3
+KEEPALIVE_COUNT = 3
+
+# (level, option, value) set on every accepted connection. Nagle is off because packets here are
+# small and latency-bound; short keepalives make a peer that vanished without a FIN surface as a
+# socket error in seconds rather than hours.
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+] + [
+    # The per-socket keepalive knobs are platform specific
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                        ("TCP_KEEPCNT", KEEPALIVE_COUNT))
+    if hasattr(socket, name)
+]
+
+def tune_socket(conn):
+    """Apply SOCKET_OPTIONS to a game connection, skipping any the platform rejects."""
+    for level, option, value in SOCKET_OPTIONS:
         try:
-            # Remove both players from waiting_lines to prevent infinite rematch loop
-            with waiting_players_lock:
-                waiting_lines[:] = [item for item in waiting_lines if item[0] not in (conn1, conn2)]
-            # Only check for disconnects if the game did NOT end normally
-            both_alive = (conn1.fileno() != -1 and conn2.fileno() != -1)
-            # Extra check: try to send a ping to both players to confirm they are really alive
-            if both_alive:
-                try:
-                    conn1.send(b"PING\n")
-                    conn2.send(b"PING\n")
-                except Exception:
-                    both_alive = False
-            if both_alive:
-                print(f"[INFO] Both players at {addr1} and {addr2} are still connected, game ended normally.")
-                with waiting_players_lock:
-                    # FIX: Always append (conn, addr, username)
-                    waiting_lines.insert(0, (conn1, addr1, username1))
-                    waiting_lines.append((conn2, addr2, username2))
-                print(f"[INFO] Two-player game between {addr1} and {addr2} ended. Players returned to lobby if still connected.")
-            else:
-                # Improved: check fileno and try to send/recv to determine who is really disconnected
-                still_connected = []
-                disconnected = []
-                for conn, addr in [(conn1, addr1), (conn2, addr2)]:
-                    alive = False
-                    if conn.fileno() != -1:
-                        try:
-                            conn.setblocking(False)
-                            try:
-                                conn.send(b"PING\n")
-                                alive = True
-                            except Exception:
-                                try:
-                                    data = conn.recv(1, socket.MSG_PEEK)
-                                    if data:
-                                        alive = True
-                                except Exception:
-                                    alive = False
-                        finally:
-                            try: conn.setblocking(True)
-                            except Exception: pass
-                    if alive:
-                        still_connected.append((conn, addr))
-                    else:
-                        disconnected.append((conn, addr))
+            conn.setsockopt(level, option, value)
+        except OSError:
+            pass
 
-                # FIX: When requeueing winner, include username
-                if len(still_connected) == 1 and len(disconnected) == 1:
-                    winner_conn, winner_addr = still_connected[0]
-                    quitter_conn, quitter_addr = disconnected[0]
-                    # Find winner's username
-                    winner_username = None
-                    if (winner_conn, winner_addr) == (conn1, addr1):
-                        winner_username = username1
-                    elif (winner_conn, winner_addr) == (conn2, addr2):
-                        winner_username = username2
-                    print(f"[INFO] Player at {winner_addr} WON (opponent timeout/disconnect, waiting for next match or Ctrl+C to exit).")
-                    print(f"[INFO] Player at {quitter_addr} QUIT or disconnected during the game or ship placement.")
-                    # --- FIX: Requeue the winner for next match ---
-                    with waiting_players_lock:
-                        if (winner_conn, winner_addr, winner_username) not in waiting_lines and winner_conn.fileno() != -1:
-                            waiting_lines.insert(0, (winner_conn, winner_addr, winner_username))
-                    try: quitter_conn.close()
-                    except Exception: pass
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to disconnect/timeout.")
-                elif len(still_connected) == 0 and len(disconnected) == 2:
-                    print(f"[INFO] Both players at {addr1} and {addr2} QUIT or disconnected during the game or ship placement.")
-                    for conn, addr in disconnected:
-                        try: conn.close()
-                        except Exception: pass
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to both disconnecting.")
-                elif len(still_connected) == 2:
-                    print(f"[INFO] Both players at {addr1} and {addr2} are still connected (unexpected).")
-                else:
-                    for conn, addr in disconnected:
-                        print(f"[INFO] Player at {addr} QUIT or disconnected during the game or ship placement.")
-                        try: conn.close()
-                        except Exception: pass
-                    for conn, addr in still_connected:
-                        print(f"[INFO] Player at {addr} is still connected.")
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to disconnect.")
+def _quickack(conn):
+    """Ask Linux to ACK immediately; the kernel clears TCP_QUICKACK after each read, so re-arm it."""
+    if hasattr(socket, "TCP_QUICKACK"):
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        except OSError:
+            pass
+
+def _recv_buffer():
+    """Return this thread's reusable recv_into scratch buffer."""
+    view = getattr(_recv_buffers, 'view', None)
+    if view is None:
+        view = _recv_buffers.view = memoryview(bytearray(RECV_CHUNK))
+    return view
+
+def _rx_buffer(conn):
+    """Return conn's buffer of received bytes that have not been returned as packets yet."""
+    with _rx_buffers_lock:
+        buf = _rx_buffers.get(conn)
+        if buf is None:
+            buf = _rx_buffers[conn] = bytearray()
+        return buf
+
+def _fill_rx_buffer(conn, buf):
+    """Append whatever one recv_into call returns to buf, raising ConnectionError on EOF."""
+    view = _recv_buffer()
+    received = conn.recv_into(view)
+    if not received:
+        raise ConnectionError("Client disconnected")
+    buf += view[:received]
+    _quickack(conn)
+
+def _packet_ready(buf):
+    """Return the length of the complete packet at the front of buf, or 0 if it is still partial."""
+    if len(buf) < HEADER_SIZE:
+        return 0
+    total = HEADER_SIZE + HEADER_STRUCT.unpack_from(buf)[2] + CHECKSUM_SIZE
+    return total if len(buf) >= total else 0
+
+def _pop_packet(buf, total):
+    """Remove the complete packet at the front of buf and return (seq, pkt_type, payload as str)."""
+    seq, pkt_type, length = HEADER_STRUCT.unpack_from(buf)
+    body_end = HEADER_SIZE + length
+    body = buf[:body_end]
+    checksum = CHECKSUM_STRUCT.unpack_from(buf, body_end)[0]
+    del buf[:total]
+    try:
+        # The header is already unpacked, so verify and decrypt directly rather than re-parsing
+        return seq, pkt_type, open_packet_body(body, checksum).decode('utf-8')
+    except Exception as e:
+        # Optionally log or handle checksum error
+        return None, None, None
 
-            game_running.clear()
-        except Exception as e:
-            print(f"[ERROR] Error in two-player game setup: {e}")
+def packet_buffered(conn):
+    """True if a complete packet from conn is already buffered, so reading it needs no syscall."""
+    return _packet_ready(_rx_buffer(conn)) != 0
 
-def broadcast_chat(sender_username, message):
-    # Defensive: ensure message is str
-    if isinstance(message, bytes):
-        message = message.decode('utf-8', errors='ignore')
-    
-    print(f"[EVENT] Broadcasting chat message from {sender_username}: '{message}'")
-    print(f"[EVENT] Active connections count: {len(active_connections)}")
-    
-    packet = build_packet(0, PKT_TYPE_CHAT, f"{sender_username}: {message}".encode('utf-8'))
-    with active_connections_lock:
-        # Defensive: remove closed connections
-        to_remove = []
-        for idx, conn in enumerate(active_connections):
-            try:
-                fd = conn.fileno() if hasattr(conn, 'fileno') else 'unknown'
-                print(f"[EVENT] Sending chat to connection {idx} (fd={fd})")
-                conn.sendall(packet)
-            except Exception as e:
-                print(f"[EVENT] Failed to send chat to connection {idx}: {e}")
-                to_remove.append(conn)
-        
-        for conn in to_remove:
-            print(f"[EVENT] Removing dead connection from active_connections")
-            active_connections.remove(conn)
+def recv_packet(conn):
+    """Receive a packet and return (seq, pkt_type, payload as str)."""
+    buf = _rx_buffer(conn)
+    # Serve from what is already buffered; only go to the kernel when no full packet is there
+    total = _packet_ready(buf)
+    while not total:
+        _fill_rx_buffer(conn, buf)
+        total = _packet_ready(buf)
+    return _pop_packet(buf, total)
+
+class GameState:
+    """Persistent state of one two player game, kept in games so a reconnect can resume it."""
+    __slots__ = (
+        'board1', 'board2', 'turn', 'placed1', 'placed2',
+        'connected', 'conns', 'addrs', 'waiting_reconnect', 'last_disconnect_time',
+        'lock', 'cv',
+    )
+
+    def __init__(self, usernames, conns, addrs):
+        self.board1 = Board(BOARD_SIZE)
+        self.board2 = Board(BOARD_SIZE)
+        self.turn = 0
+        self.placed1 = False
+        self.placed2 = False
+        self.connected = {u: True for u in usernames}
+        self.conns = dict(zip(usernames, conns))
+        self.addrs = dict(zip(usernames, addrs))
+        self.waiting_reconnect = False
+        self.last_disconnect_time = None
+        self.lock = threading.RLock()  # guards multi-field updates of this game state
+        self.cv = threading.Condition(self.lock)  # notified on disconnect/reconnect to wake the supervisor
+
+    def rebind(self, usernames, conns, addrs):
+        """Attach a resumed game to the players' new connections and mark them connected."""
+        with self.lock:
+            for u, c, a in zip(usernames, conns, addrs):
+                self.connected[u] = True
+                self.conns[u] = c
+                self.addrs[u] = a
+            self.waiting_reconnect = False
+            self.last_disconnect_time = None
+
+    def save(self, board1, board2, turn, placed1, placed2):
+        """save_state_hook for the battleship loop: record progress so a reconnect can resume it."""
+        with self.lock:
+            self.board1 = board1
+            self.board2 = board2
+            self.turn = turn
+            self.placed1 = placed1
+            self.placed2 = placed2
+
+    def mark_disconnected(self, username):
+        """player_disconnected_callback for the battleship loop: start waiting for a reconnect."""
+        with self.cv:
+            self.connected[username] = False
+            # --- Set waiting_reconnect immediately on disconnect ---
+            self.waiting_reconnect = True
+            self.last_disconnect_time = time.monotonic()
+            self.cv.notify_all()
+
+def _ensure_game_state(game_key, usernames, conns, addrs):
+    """
+    Return the GameState for game_key. A saved game is rebound to the given connections;
+    otherwise a fresh GameState is stored, so boards are only ever built once per game.
+    """
+    with games_lock:
+        game_state = games.get(game_key)
+        if game_state is None:
+            game_state = games[game_key] = GameState(usernames, conns, addrs)
+            return game_state
+    game_state.rebind(usernames, conns, addrs)
+    return game_state
+
+def _discard_game_state(game_key, game_state):
+    """Remove game_key from games only if it still maps to game_state, not a newer game."""
+    with games_lock:
+        if games.get(game_key) is game_state:
+            del games[game_key]
+
+def _claim_reconnect(username, conn, addr):
+    """
+    Attach conn to a game waiting for username to reconnect. The check and the update happen
+    under the game's lock, so two connections for the same player cannot both claim it.
+    Returns (game_key, game_state), or (None, None) if no game is waiting for this player.
+    """
+    with games_lock:
+        candidates = [(k, gs) for k, gs in games.items() if username in k]
+    for game_key, game_state in candidates:
+        with game_state.cv:
+            if game_state.waiting_reconnect and not game_state.connected[username]:
+                game_state.connected[username] = True
+                game_state.conns[username] = conn
+                game_state.addrs[username] = addr
+                game_state.cv.notify_all()
+                return game_key, game_state
+    return None, None
 
-def recv_packet_handle_chat(conn, username):
-    """Receive a packet, handle chat packets inline, and return only game packets."""
-    while True:
+class ConnState:
+    """
+    One player's connection during a game: packet sequence counters plus the file-like
+    write/flush/readline methods the game loops in battleship.py call.
+    """
+    __slots__ = ('conn', 'username', 'seq_send', 'seq_recv', 'pending', 'selector', 'send_lock')
+
+    def __init__(self, conn, username, wakeup=None):
+        self.conn = conn
+        self.username = username
+        self.seq_send = 0
+        self.seq_recv = 0
+        self.pending = bytearray()  # packets framed by write(), sent in one sendall by flush()
+        # disconnect_and_pause writes to both players from whichever thread saw the disconnect,
+        # so seq_send and pending are only touched under this lock. It is the connection's
+        # send lock, so chat sent to an in-game player never lands inside a game packet.
+        self.send_lock = conn_send_lock(conn)
+        self.selector = None
+        if wakeup is not None:
+            # Reads wait on the connection and the game's wake-up socket together
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(conn, selectors.EVENT_READ)
+            self.selector.register(wakeup, selectors.EVENT_READ)
+
+    def send(self, msg):
+        with self.send_lock:
+            send_packet(self.conn, self.seq_send, PKT_TYPE_GAME, msg)
+            self.seq_send += 1
+
+    def send_prebuilt(self, packet):
+        """Send an already framed packet, counting it against the send sequence."""
+        with self.send_lock:
+            self.conn.sendall(packet)
+            self.seq_send += 1
+
+    def recv(self):
+        self.seq_recv, pkt_type, payload = recv_packet_handle_chat(self.conn, self.username, self.selector)
+        return payload
+
+    def write(self, msg):
+        with self.send_lock:
+            self.pending.extend(frame_packet(self.seq_send, PKT_TYPE_GAME, msg))
+            self.seq_send += 1
+
+    def flush(self):
+        # Held across the sendall, so nothing is appended to or cleared from pending mid-send
+        with self.send_lock:
+            if self.pending:
+                self.conn.sendall(self.pending)
+                self.pending.clear()
+
+    def readline(self):
+        self.flush()  # Never block on input with output still buffered
+        return self.recv()
+
+    def close_selector(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+
+def _peer_alive(conn):
+    """
+    Probe a connection without writing to it. A raw probe would desync the client's packet
+    stream, so peek instead: EOF or an error means the peer is gone, no data yet means alive.
+    """
+    if conn.fileno() == -1:
+        return False
+    try:
+        conn.setblocking(False)
         try:
-            seq, pkt_type, payload = recv_packet(conn)
-        except Exception as e:
-            # Defensive: treat disconnect as fatal
-            print(f"[EVENT] Exception in recv_packet_handle_chat for {username}: {e}")
-            raise ConnectionError("Client disconnected")
-        
-        if pkt_type == PKT_TYPE_CHAT:
-            # Defensive: decode payload if it's bytes (for robustness)
-            if isinstance(payload, bytes):
-                payload = payload.decode('utf-8', errors='ignore')
-            
-            if payload is not None and payload.strip() != "":
-                print(f"[EVENT] Received chat message from {username}: '{payload}'")
-                broadcast_chat(username, payload)
-            else:
-                print(f"[EVENT] Received empty chat message from {username}")
-            
-            continue  # Wait for next packet
-        
-        if pkt_type is None or payload is None:
-            print(f"[EVENT] Received invalid packet (type={pkt_type}, payload={payload}) from {username}")
-            raise ConnectionError("Client disconnected")
-        
-        return seq, pkt_type, payload
+            return conn.recv(1, socket.MSG_PEEK) != b""
+        finally:
+            conn.setblocking(True)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
 
 def handle_initial_connection(conn, addr):
     """
@@ -620,20 +491,20 @@ def handle_initial_connection(conn, addr):
         # Receive USERNAME packet
         seq_recv, pkt_type, payload = recv_packet(conn)
         if pkt_type != PKT_TYPE_GAME or not payload.startswith("USERNAME "):
-            send_packet(conn, seq, PKT_TYPE_GAME, "ERROR: Must provide USERNAME <name> as first message.")
+            send_bytes(conn, restamp_packet(PKT_BAD_HANDSHAKE, seq))
             conn.close()
             return None, None, None
         username = payload.strip().split(" ", 1)[1]
         if not username:
-            send_packet(conn, seq, PKT_TYPE_GAME, "ERROR: Username cannot be empty.")
+            send_bytes(conn, restamp_packet(PKT_EMPTY_USERNAME, seq))
             conn.close()
             return None, None, None
-        print(f"[EVENT] Received username: {username} from {addr}")
+        logger.info("Received username: %s from %s", username, addr)
         # --- Send a protocol welcome/lobby message immediately after handshake ---
-        send_packet(conn, seq+1, PKT_TYPE_GAME, "WELCOME! Waiting for game to start...")
+        send_bytes(conn, restamp_packet(PKT_WELCOME, seq+1))
         return username, conn, addr
     except Exception as e:
-        print(f"[EVENT] Exception in handle_initial_connection: {e}")
+        logger.warning("Exception in handle_initial_connection: %s", e)
         try: conn.close()
         except: pass
         return None, None, None
@@ -641,74 +512,73 @@ def handle_initial_connection(conn, addr):
 def wait_for_reconnect(username, old_session, mode):
     """
     Waits up to RECONNECT_TIMEOUT seconds for the player to reconnect.
+    game_manager hands the new connection over by setting the session's reconnect_event.
     Returns new (conn, addr) if reconnected, else None.
     """
-    start_time = time.time()
-    while time.time() - start_time < RECONNECT_TIMEOUT:
-        with player_sessions_lock:
-            session = player_sessions.get(username)
-            if session and session.get('reconnected'):
-                # Got a new connection
-                conn = session['conn']
-                addr = session['addr']
-                session['reconnected'] = False  # Reset for future disconnects
-                return conn, addr
-        time.sleep(0.5)
+    old_session['reconnect_event'].wait(RECONNECT_TIMEOUT)
+    with player_sessions_lock:
+        old_session['disconnected'] = False  # Stop accepting hand-offs either way
+        if old_session.get('reconnected'):
+            # Got a new connection
+            old_session['reconnected'] = False  # Reset for future disconnects
+            old_session['reconnect_event'].clear()
+            return old_session['conn'], old_session['addr']
     return None, None
 
 def single_player(conn, addr, username):
     try:
-        seq_send = 0
-        seq_recv = 0
-        print(f"[EVENT] Starting single player game for {addr}")
-
-        def send(msg):
-            nonlocal seq_send
-            send_packet(conn, seq_send, PKT_TYPE_GAME, msg)
-            seq_send += 1
-
-        def recv():
-            nonlocal seq_recv
-            s, pkt_type, payload = recv_packet_handle_chat(conn, username)
-            seq_recv = s
-            return payload
-
+        logger.info("Starting single player game for %s", addr)
+        player = ConnState(conn, username)
         # Add instruction for ship placement
-        instruction = (
-            "INSTRUCTION: To place a ship, type: place <start_coord> <orientation> <ship_name>\n"
-            "Example: place b6 v carrier\n"
-        )
-        send(instruction)
-
-        class WFileWrapper:
-            def write(self, msg):
-                send(msg)
-            def flush(self):
-                pass
-
-        class RFileWrapper:
-            def readline(self):
-                return recv()
-
-        run_single_player_game_online(RFileWrapper(), WFileWrapper())
-        print(f"[EVENT] Finished single player game for {addr}")
+        player.send_prebuilt(INSTRUCTION_PACKET)
+        run_single_player_game_online(player, player)
+        logger.info("Finished single player game for %s", addr)
     except Exception as e:
-        print(f"[WARN] Single player client {addr} ({username}) disconnected: {e}")
+        logger.warning("Single player client %s (%s) disconnected: %s", addr, username, e)
         # Wait for reconnection
         with player_sessions_lock:
             player_sessions[username]['disconnected'] = True
-        print(f"[INFO] Waiting {RECONNECT_TIMEOUT}s for {username} to reconnect...")
+        logger.info("Waiting %ss for %s to reconnect...", RECONNECT_TIMEOUT, username)
         new_conn, new_addr = wait_for_reconnect(username, player_sessions[username], mode="1")
         if new_conn:
-            print(f"[INFO] {username} reconnected from {new_addr}. Resuming game.")
+            logger.info("%s reconnected from %s. Resuming game.", username, new_addr)
             # TODO: Restore game state if needed (for single player, may need to persist board)
             # For now, just restart a new game
             single_player(new_conn, new_addr, username)
         else:
-            print(f"[INFO] {username} did not reconnect in time. Forfeiting game.")
+            logger.info("%s did not reconnect in time. Forfeiting game.", username)
     finally:
         conn.close()
-        print(f"[INFO] Single player client {addr} ({username}) connection closed.")
+        logger.info("Single player client %s (%s) connection closed.", addr, username)
+
+def lobby_broadcast(msg):
+    """Send a game status line to every waiting player, skipping any whose buffer is full."""
+    # Build the packet once and send the same bytes to every waiting player
+    pkt = build_packet(0, PKT_TYPE_GAME, (msg + "\n").encode())
+    with waiting_players_lock:
+        lobby = tuple(c for c, a in waiting_lines.values())
+    for c in lobby:
+        try:
+            # Runs on the game thread, so a lobby player with a full buffer just misses the update
+            try_send_bytes(c, pkt)
+        except Exception:
+            pass
+
+def send_info_to_players(disconnected, connected, game_state):
+    """Tell the remaining player the opponent dropped, and the dropped player how long they have."""
+    try:
+        if disconnected and connected:
+            loser = disconnected[0]
+            winner = connected[0]
+            loser_conn = game_state.conns[loser]
+            winner_conn = game_state.conns[winner]
+            send_bytes(winner_conn, PKT_OPPONENT_DISCONNECTED)
+            try:
+                send_bytes(loser_conn, PKT_YOU_DISCONNECTED)
+            except Exception:
+                pass
+    except Exception:
+        pass
 
 def two_player_game(conn1, addr1, conn2, addr2, username1, username2):
     global game_running
@@ -716,293 +586,174 @@ def two_player_game(conn1, addr1, conn2, addr2, username1, username2):
     winner_addr = None
     last_winner_addr = None
     game_key = tuple(sorted([username1, username2]))
-    try:
-        # --- NEW: Mark both players as connected in game state ---
-        game_state = games.get(game_key)
-        if not game_state:
-            board1 = Board(BOARD_SIZE)
-            board2 = Board(BOARD_SIZE)
-            turn = 0
-            placed1 = False
-            placed2 = False
-            games[game_key] = {
-                'board1': board1,
-                'board2': board2,
-                'turn': turn,
-                'placed1': placed1,
-                'placed2': placed2,
-                'connected': {username1: True, username2: True},
-                'conns': {username1: conn1, username2: conn2},
-                'addrs': {username1: addr1, username2: addr2},
-                'waiting_reconnect': False,
-                'last_disconnect_time': None
-            }
-        else:
-            board1 = game_state['board1']
-            board2 = game_state['board2']
-            turn = game_state['turn']
-            placed1 = game_state.get('placed1', False)
-            placed2 = game_state.get('placed2', False)
-            game_state['connected'][username1] = True
-            game_state['connected'][username2] = True
-            game_state['conns'][username1] = conn1
-            game_state['conns'][username2] = conn2
-            game_state['addrs'][username1] = addr1
-            game_state['addrs'][username2] = addr2
-            game_state['waiting_reconnect'] = False
-            game_state['last_disconnect_time'] = None
-
-        seq_send1 = 0
-        seq_recv1 = 0
-        seq_send2 = 0
-        seq_recv2 = 0
-
-        def send1(msg):
-            nonlocal seq_send1
-            send_packet(conn1, seq_send1, PKT_TYPE_GAME, msg)
-            seq_send1 += 1
-
-        def send2(msg):
-            nonlocal seq_send2
-            send_packet(conn2, seq_send2, PKT_TYPE_GAME, msg)
-            seq_send2 += 1
-
-        def recv1():
-            nonlocal seq_recv1
-            s, pkt_type, payload = recv_packet_handle_chat(conn1, username1)
-            seq_recv1 = s
-            return payload
-
-        def recv2():
-            nonlocal seq_recv2
-            s, pkt_type, payload = recv_packet_handle_chat(conn2, username2)
-            seq_recv2 = s
-            return payload
-
-        class WFileWrapper1:
-            def write(self, msg):
-                send1(msg)
-            def flush(self):
-                pass
+    # The supervisor writes a byte here to wake the game thread out of a blocked read
+    wake_r, wake_w = socket.socketpair()
 
-        class WFileWrapper2:
-            def write(self, msg):
-                send2(msg)
-            def flush(self):
-                pass
-
-        class RFileWrapper1:
-            def readline(self):
-                return recv1()
-
-        class RFileWrapper2:
-            def readline(self):
-                return recv2()
+    def terminate_game():
+        try:
+            wake_w.send(b"\0")
+        except OSError:
+            pass  # Game thread already finished and closed it
 
-        print(f"[EVENT] Starting two player game for {addr1} and {addr2}")
-        instruction = (
-            "INSTRUCTION: To place a ship, type: place <start_coord> <orientation> <ship_name>\n"
-            "Example: place b6 v carrier\n"
-        )
-        send1(instruction)
-        send2(instruction)
-        def lobby_broadcast(msg):
-            with waiting_players_lock:
-                for c, a, u in waiting_lines:
-                    try:
-                        lobby_wfile = c.makefile('w')
-                        lobby_wfile.write(msg + "\n")
-                        lobby_wfile.flush()
-                    except Exception:
-                        pass
+    with game_terminators_lock:
+        game_terminators.add(terminate_game)
+    game_future = None
+    try:
+        # --- NEW: Mark both players as connected in game state ---
+        game_state = _ensure_game_state(
+            game_key, (username1, username2), (conn1, conn2), (addr1, addr2))
+        with game_state.lock:
+            board1 = game_state.board1
+            board2 = game_state.board2
+            turn = game_state.turn
+            placed1 = game_state.placed1
+            placed2 = game_state.placed2
+
+        player1 = ConnState(conn1, username1, wake_r)
+        player2 = ConnState(conn2, username2, wake_r)
+
+        logger.debug("Starting two player game for %s and %s", addr1, addr2)
+        player1.send_prebuilt(INSTRUCTION_PACKET)
+        player2.send_prebuilt(INSTRUCTION_PACKET)
         with player_sessions_lock:
             player_sessions[username1]['in_game'] = True
             player_sessions[username2]['in_game'] = True
         game_running.set()
 
-        # --- Game state restoration logic ---
-        game_state = games.get(game_key)
-        if not game_state:
-            # New game state
-            board1 = Board(BOARD_SIZE)
-            board2 = Board(BOARD_SIZE)
-            turn = 0
-            placed1 = False
-            placed2 = False
-            games[game_key] = {
-                'board1': board1,
-                'board2': board2,
-                'turn': turn,
-                'placed1': placed1,
-                'placed2': placed2
-            }
-        else:
-            board1 = game_state['board1']
-            board2 = game_state['board2']
-            turn = game_state['turn']
-            placed1 = game_state.get('placed1', False)
-            placed2 = game_state.get('placed2', False)
-
-        # Pass state to battleship logic
-        def save_state_hook(board1, board2, turn, placed1, placed2):
-            games[game_key]['board1'] = board1
-            games[game_key]['board2'] = board2
-            games[game_key]['turn'] = turn
-            games[game_key]['placed1'] = placed1
-            games[game_key]['placed2'] = placed2
-
-        # --- NEW: Wrap run_two_player_game_online to handle disconnects and reconnections ---
-        def player_disconnected_callback(username):
-            game_state = games.get(game_key)
-            if game_state:
-                game_state['connected'][username] = False
-                # --- Set waiting_reconnect immediately on disconnect ---
-                game_state['waiting_reconnect'] = True
-                game_state['last_disconnect_time'] = time.time()
-
-        def send_info_to_players(disconnected, connected, game_state):
-            try:
-                if disconnected and connected:
-                    loser = disconnected[0]
-                    winner = connected[0]
-                    loser_conn = game_state['conns'][loser]
-                    winner_conn = game_state['conns'][winner]
-                    winner_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"INFO: Opponent disconnected. Waiting up to 60 seconds for them to reconnect..."))
-                    try:
-                        loser_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"INFO: You have been disconnected. If you reconnect within 60 seconds, you can resume the game."))
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+        # --- Monitor disconnects while the game is running ---
+        # Bind the per-game containers once; the loop only reads through these locals
+        cv = game_state.cv
+        connected_map = game_state.connected
+        conns = game_state.conns
+        addrs = game_state.addrs
+        game_done = threading.Event()  # set by run_game on exit, before it notifies cv
 
         # --- NEW: Use a dedicated function to run the game logic ---
         def run_game():
-            run_two_player_game_online(
-                RFileWrapper1(), WFileWrapper1(),
-                RFileWrapper2(), WFileWrapper2(),
-                lobby_broadcast=lobby_broadcast,
-                usernames=(username1, username2),
-                board1=board1,
-                board2=board2,
-                turn=turn,
-                placed1=placed1,
-                placed2=placed2,
-                save_state_hook=save_state_hook,
-                player_disconnected_callback=player_disconnected_callback
-            )
-
-        game_thread = threading.Thread(target=run_game)
-        game_thread.start()
+            try:
+                run_two_player_game_online(
+                    player1, player1,
+                    player2, player2,
+                    lobby_broadcast=lobby_broadcast,
+                    usernames=(username1, username2),
+                    board1=board1,
+                    board2=board2,
+                    turn=turn,
+                    placed1=placed1,
+                    placed2=placed2,
+                    save_state_hook=game_state.save,
+                    player_disconnected_callback=game_state.mark_disconnected
+                )
+            except Exception:
+                # A pooled future would otherwise swallow the traceback
+                logger.exception("Game loop for %s crashed", game_key)
+            finally:
+                # Wake the supervisor now rather than on its next timeout
+                game_done.set()
+                with cv:
+                    cv.notify_all()
+                player1.close_selector()
+                player2.close_selector()
+                wake_r.close()
+                wake_w.close()
+
+        game_future = game_executor.submit(run_game)
 
-        # --- Monitor disconnects while the game is running ---
-        game_state = games.get(game_key)
         disconnect_timeout_started = False
-        disconnect_start_time = None
+        forfeit_deadline = None  # time.monotonic() at which the disconnected player forfeits; the only timed wake-up
         disconnected_user = None
         connected_user = None
 
         while True:
-            if not game_thread.is_alive():
-                break
-            if game_state:
-                disconnected = [u for u, c in game_state['connected'].items() if not c]
-                connected = [u for u, c in game_state['connected'].items() if c]
+            with cv:
+                if game_done.is_set():
+                    break
+                disconnected = []
+                connected = []
+                for u, c in connected_map.items():
+                    (connected if c else disconnected).append(u)
                 # Start timeout as soon as one player disconnects
                 if not disconnect_timeout_started and len(disconnected) == 1 and len(connected) == 1:
                     disconnect_timeout_started = True
-                    disconnect_start_time = time.time()
+                    # Monotonic, so a wall-clock adjustment cannot shorten or extend the grace period
+                    forfeit_deadline = time.monotonic() + RECONNECT_TIMEOUT
                     disconnected_user = disconnected[0]
                     connected_user = connected[0]
-                    print(f"[INFO] Waiting 60s for {disconnected_user} to reconnect...")
+                    logger.info("Waiting 60s for %s to reconnect...", disconnected_user)
                     send_info_to_players([disconnected_user], [connected_user], game_state)
                 # If timeout started, check for reconnect or timeout expiry
                 if disconnect_timeout_started:
                     # If both disconnected, break immediately
                     if len(connected) == 0 and len(disconnected) == 2:
-                        print(f"[INFO] Both players at {addr1} and {addr2} QUIT or disconnected during the game or ship placement.")
+                        logger.info("Both players at %s and %s QUIT or disconnected during the game or ship placement.", addr1, addr2)
                         break
                     # If reconnected, resume game
-                    if all(game_state['connected'].values()):
-                        print(f"[INFO] {', '.join(game_state['connected'].keys())} reconnected for game {game_key}.")
-                        print(f"[INFO] Both players reconnected for game {game_key}.")
+                    if not disconnected:
+                        logger.info("%s reconnected for game %s.", ', '.join(connected_map), game_key)
+                        logger.info("Both players reconnected for game %s.", game_key)
                         disconnect_timeout_started = False
-                        disconnect_start_time = None
+                        forfeit_deadline = None
                         disconnected_user = None
                         connected_user = None
                     # If timeout expired, forfeit
-                    elif time.time() - disconnect_start_time >= RECONNECT_TIMEOUT:
-                        print(f"[INFO] {disconnected_user} did not reconnect in time. {connected_user} wins by forfeit.")
+                    elif time.monotonic() >= forfeit_deadline:
+                        logger.info("%s did not reconnect in time. %s wins by forfeit.", disconnected_user, connected_user)
                         try:
-                            winner_conn = game_state['conns'][connected_user]
-                            winner_addr = game_state['addrs'][connected_user]
-                            winner_username = connected_user
-                            winner_conn.sendall(build_packet(0, PKT_TYPE_GAME, b"OPPONENT_TIMEOUT. You win!"))
+                            send_bytes(conns[connected_user], PKT_OPPONENT_TIMEOUT)
                         except Exception:
-                            winner_conn = None
-                            winner_addr = None
-                            winner_username = None
-                        # End the game and requeue the winner for next match
-                        game_state['waiting_reconnect'] = False
-                        del games[game_key]
-                        if winner_conn and winner_conn.fileno() != -1:
-                            with waiting_players_lock:
-                                if (winner_conn, winner_addr, winner_username) not in waiting_lines:
-                                    waiting_lines.insert(0, (winner_conn, winner_addr, winner_username))
-                        # --- Immediately break so lobby_manager can match the winner ---
+                            pass
+                        # End the game; the cleanup below requeues the winner
+                        terminate_game()
+                        game_state.waiting_reconnect = False
+                        _discard_game_state(game_key, game_state)
+                        # --- Break so the cleanup below requeues the winner once the game thread exits ---
                         break
-            time.sleep(0.5)
+                # Checked and waited under the same lock, so no notification is missed.
+                # Game end, disconnects and reconnects all notify cv, so the supervisor
+                # sleeps until one of them happens or the forfeit deadline passes.
+                cv.wait(None if forfeit_deadline is None else max(0.0, forfeit_deadline - time.monotonic()))
 
         # --- Cleanup and lobby requeue logic ---
     except Exception as e:
-        print(f"[ERROR] Exception during game: {e}")
+        logger.error("Exception during game: %s", e)
         # --- Remove immediate win/forfeit logic here ---
-        print(f"[INFO] Notified remaining player(s) of win and returning to lobby.")
+        logger.info("Notified remaining player(s) of win and returning to lobby.")
     finally:
+        with game_terminators_lock:
+            game_terminators.discard(terminate_game)
+        terminate_game()  # Make sure the game thread is not left blocked on a read
+        if game_future is not None:
+            # Both sockets go back to the lobby reactor below; the game thread must not still be reading them
+            if wait_futures((game_future,), timeout=GAME_STOP_TIMEOUT).not_done:
+                logger.warning("Game thread for %s did not stop within %ss.", game_key, GAME_STOP_TIMEOUT)
         with player_sessions_lock:
             player_sessions[username1]['in_game'] = False
             player_sessions[username2]['in_game'] = False
         try:
             # Remove both players from waiting_lines to prevent infinite rematch loop
             with waiting_players_lock:
-                waiting_lines[:] = [item for item in waiting_lines if item[0] not in (conn1, conn2)]
+                waiting_lines.pop(username1, None)
+                waiting_lines.pop(username2, None)
+                lobby_unwatch(conn1)
+                lobby_unwatch(conn2)
             # Only check for disconnects if the game did NOT end normally
             both_alive = (conn1.fileno() != -1 and conn2.fileno() != -1)
-            # Extra check: try to send a ping to both players to confirm they are really alive
+            # Extra check: probe both players to confirm they are really alive
             if both_alive:
-                try:
-                    conn1.send(b"PING\n")
-                    conn2.send(b"PING\n")
-                except Exception:
-                    both_alive = False
+                both_alive = _peer_alive(conn1) and _peer_alive(conn2)
             if both_alive:
-                print(f"[INFO] Both players at {addr1} and {addr2} are still connected, game ended normally.")
+                logger.info("Both players at %s and %s are still connected, game ended normally.", addr1, addr2)
                 with waiting_players_lock:
-                    # FIX: Always append (conn, addr, username)
-                    waiting_lines.insert(0, (conn1, addr1, username1))
-                    waiting_lines.append((conn2, addr2, username2))
-                print(f"[INFO] Two-player game between {addr1} and {addr2} ended. Players returned to lobby if still connected.")
+                    lobby_requeue_front(conn1, addr1, username1)
+                    waiting_lines[username2] = (conn2, addr2)
+                    lobby_watch(conn2, addr2, username2)
+                logger.info("Two-player game between %s and %s ended. Players returned to lobby if still connected.", addr1, addr2)
             else:
                 # Improved: check fileno and try to send/recv to determine who is really disconnected
                 still_connected = []
                 disconnected = []
                 for conn, addr in [(conn1, addr1), (conn2, addr2)]:
-                    alive = False
-                    if conn.fileno() != -1:
-                        try:
-                            conn.setblocking(False)
-                            try:
-                                conn.send(b"PING\n")
-                                alive = True
-                            except Exception:
-                                try:
-                                    data = conn.recv(1, socket.MSG_PEEK)
-                                    if data:
-                                        alive = True
-                                except Exception:
-                                    alive = False
-                        finally:
-                            try: conn.setblocking(True)
-                            except Exception: pass
+                    alive = _peer_alive(conn)
                     if alive:
                         still_connected.append((conn, addr))
                     else:
@@ -1018,68 +769,125 @@ def two_player_game(conn1, addr1, conn2, addr2, username1, username2):
                         winner_username = username1
                     elif (winner_conn, winner_addr) == (conn2, addr2):
                         winner_username = username2
-                    print(f"[INFO] Player at {winner_addr} WON (opponent timeout/disconnect, waiting for next match or Ctrl+C to exit).")
-                    print(f"[INFO] Player at {quitter_addr} QUIT or disconnected during the game or ship placement.")
+                    logger.info("Player at %s WON (opponent timeout/disconnect, waiting for next match or Ctrl+C to exit).", winner_addr)
+                    logger.info("Player at %s QUIT or disconnected during the game or ship placement.", quitter_addr)
                     # --- FIX: Requeue the winner for next match ---
                     with waiting_players_lock:
-                        if (winner_conn, winner_addr, winner_username) not in waiting_lines and winner_conn.fileno() != -1:
-                            waiting_lines.insert(0, (winner_conn, winner_addr, winner_username))
+                        if winner_conn.fileno() != -1:
+                            lobby_requeue_front(winner_conn, winner_addr, winner_username)
                     try: quitter_conn.close()
                     except Exception: pass
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to disconnect/timeout.")
+                    logger.info("Two-player game between %s and %s ended due to disconnect/timeout.", addr1, addr2)
                 elif len(still_connected) == 0 and len(disconnected) == 2:
-                    print(f"[INFO] Both players at {addr1} and {addr2} QUIT or disconnected during the game or ship placement.")
+                    logger.info("Both players at %s and %s QUIT or disconnected during the game or ship placement.", addr1, addr2)
                     for conn, addr in disconnected:
                         try: conn.close()
                         except Exception: pass
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to both disconnecting.")
+                    logger.info("Two-player game between %s and %s ended due to both disconnecting.", addr1, addr2)
                 elif len(still_connected) == 2:
-                    print(f"[INFO] Both players at {addr1} and {addr2} are still connected (unexpected).")
+                    logger.info("Both players at %s and %s are still connected (unexpected).", addr1, addr2)
                 else:
                     for conn, addr in disconnected:
-                        print(f"[INFO] Player at {addr} QUIT or disconnected during the game or ship placement.")
+                        logger.info("Player at %s QUIT or disconnected during the game or ship placement.", addr)
                         try: conn.close()
                         except Exception: pass
                     for conn, addr in still_connected:
-                        print(f"[INFO] Player at {addr} is still connected.")
-                    print(f"[INFO] Two-player game between {addr1} and {addr2} ended due to disconnect.")
+                        logger.info("Player at %s is still connected.", addr)
+                    logger.info("Two-player game between %s and %s ended due to disconnect.", addr1, addr2)
 
             game_running.clear()
+            # Wake the lobby manager so the next match can be formed
+            with waiting_players_cv:
+                waiting_players_cv.notify_all()
         except Exception as e:
-            print(f"[ERROR] Error in two-player game setup: {e}")
+            logger.error("Error in two-player game setup: %s", e)
 
 def broadcast_chat(sender_username, message):
+    """Queue a chat message for chat_broadcaster; never blocks on other clients' sockets."""
     # Defensive: ensure message is str
     if isinstance(message, bytes):
         message = message.decode('utf-8', errors='ignore')
-    
-    print(f"[EVENT] Broadcasting chat message from {sender_username}: '{message}'")
-    print(f"[EVENT] Active connections count: {len(active_connections)}")
-    
-    packet = build_packet(0, PKT_TYPE_CHAT, f"{sender_username}: {message}".encode('utf-8'))
+    chat_queue.put((sender_username, message))
+
+def add_active_connection(conn):
+    """Start sending chat to conn. Returns False if it was already receiving chat."""
+    global active_connections
+    with active_connections_lock:
+        if conn in active_connections:
+            return False
+        active_connections = active_connections | {conn}
+        return True
+
+def discard_active_connections(*conns):
+    """Stop sending chat to the given connections."""
+    global active_connections
     with active_connections_lock:
-        # Defensive: remove closed connections
-        to_remove = []
-        for idx, conn in enumerate(active_connections):
+        active_connections = active_connections.difference(conns)
+
+def connection_sweeper():
+    """Drops dead sockets from active_connections in batches, so the set is rebuilt once per burst."""
+    while True:
+        dead = {dead_connections.get()}
+        while True:
             try:
-                print(f"[EVENT] Sending chat to connection {idx} (fd={conn.fileno() if hasattr(conn, 'fileno') else 'unknown'})")
-                conn.sendall(packet)
+                dead.add(dead_connections.get_nowait())
+            except queue.Empty:
+                break
+        logger.debug("Removing %s dead connection(s) from active_connections", len(dead))
+        discard_active_connections(*dead)
+
+def chat_broadcaster():
+    """Single worker thread that fans out queued chat messages to every active connection."""
+    # Locals for the per-connection loop, which runs for every peer on every batch
+    send = try_send_bytes
+    mark_dead = dead_connections.put
+    while True:
+        # Drain whatever else is already queued so a burst costs one send per connection
+        batch = [chat_queue.get()]
+        while len(batch) < CHAT_BATCH_MAX:
+            try:
+                batch.append(chat_queue.get_nowait())
+            except queue.Empty:
+                break
+        # The set is never mutated in place, so this reference is a consistent snapshot
+        snapshot = active_connections
+        for sender_username, message in batch:
+            logger.debug("Broadcasting chat message from %s to %s connection(s): '%s'", sender_username, len(snapshot), message)
+        if not snapshot:
+            continue
+
+        # Packets are length-prefixed, so back-to-back packets in one buffer stay framed
+        packet = b"".join(
+            build_packet(0, PKT_TYPE_CHAT, f"{sender_username}: {message}".encode('utf-8'))
+            for sender_username, message in batch
+        )
+        trace = logger.isEnabledFor(logging.DEBUG)  # Skip per-peer fileno() calls unless tracing
+        for idx, conn in enumerate(snapshot):
+            try:
+                if trace:
+                    logger.debug("Sending chat to connection %s (fd=%s)", idx, conn.fileno())
+                if not send(conn, packet):
+                    # A peer that is not draining its socket misses this message rather than stalling everyone
+                    logger.debug("Dropped chat to connection %s: send buffer full", idx)
             except Exception as e:
-                print(f"[EVENT] Failed to send chat to connection {idx}: {e}")
-                to_remove.append(conn)
-        
-        for conn in to_remove:
-            print(f"[EVENT] Removing dead connection from active_connections")
-            active_connections.remove(conn)
+                logger.debug("Failed to send chat to connection %s: %s", idx, e)
+                mark_dead(conn)
 
-def recv_packet_handle_chat(conn, username):
-    """Receive a packet, handle chat packets inline, and return only game packets."""
+def recv_packet_handle_chat(conn, username, selector=None):
+    """
+    Receive a packet, handle chat packets inline, and return only game packets.
+    If selector also watches a wake-up socket (see ConnState), a byte on it aborts the wait.
+    """
     while True:
+        if selector is not None and not packet_buffered(conn):
+            for key, _ in selector.select():
+                if key.fileobj is not conn:
+                    raise ConnectionAbortedError("Game terminated")
         try:
             seq, pkt_type, payload = recv_packet(conn)
         except Exception as e:
             # Defensive: treat disconnect as fatal
-            print(f"[EVENT] Exception in recv_packet_handle_chat for {username}: {e}")
+            logger.debug("Exception in recv_packet_handle_chat for %s: %s", username, e)
             raise ConnectionError("Client disconnected")
         
         if pkt_type == PKT_TYPE_CHAT:
@@ -1088,241 +896,505 @@ def recv_packet_handle_chat(conn, username):
                 payload = payload.decode('utf-8', errors='ignore')
             
             if payload is not None and payload.strip() != "":
-                print(f"[EVENT] Received chat message from {username}: '{payload}'")
+                logger.debug("Received chat message from %s: '%s'", username, payload)
                 broadcast_chat(username, payload)
             else:
-                print(f"[EVENT] Received empty chat message from {username}")
+                logger.debug("Received empty chat message from %s", username)
             
             continue  # Wait for next packet
         
         if pkt_type is None or payload is None:
-            print(f"[EVENT] Received invalid packet (type={pkt_type}, payload={payload}) from {username}")
+            logger.debug("Received invalid packet (type=%s, payload=%s) from %s", pkt_type, payload, username)
             raise ConnectionError("Client disconnected")
         
         return seq, pkt_type, payload
 
 def game_manager(conn, addr, mode):
     username, conn, addr = handle_initial_connection(conn, addr)
-    print(f"[EVENT] game_manager got username: {username}")
+    logger.debug("game_manager got username: %s", username)
     if not username:
-        print(f"[EVENT] Username handshake failed for {addr}")
+        logger.warning("Username handshake failed for %s", addr)
         return
 
     # Add connection to active_connections for chat as soon as a valid user connects
-    with active_connections_lock:
-        if conn not in active_connections and conn.fileno() != -1:
-            active_connections.append(conn)
-            print(f"[EVENT] Added {addr} ({username}) to active_connections for chat right after connection")
+    if conn.fileno() != -1 and add_active_connection(conn):
+        logger.debug("Added %s (%s) to active_connections for chat right after connection", addr, username)
 
+    handed_off = False
     with player_sessions_lock:
-        player_sessions[username] = {
-            'conn': conn,
-            'addr': addr,
-            'last_active': time.time(),
-            'disconnected': False,
-            'reconnected': False,
-            'in_game': False,
-        }
+        session = player_sessions.get(username)
+        if mode == "1" and session and session.get('disconnected') and not session.get('reconnected'):
+            # A single player thread is blocked in wait_for_reconnect; hand it this connection
+            session['conn'] = conn
+            session['addr'] = addr
+            session['last_active'] = time.time()
+            session['reconnected'] = True
+            session['reconnect_event'].set()
+            handed_off = True
+        else:
+            player_sessions[username] = {
+                'conn': conn,
+                'addr': addr,
+                'last_active': time.time(),
+                'disconnected': False,
+                'reconnected': False,
+                'in_game': False,
+                'reconnect_event': threading.Event(),
+            }
+    if handed_off:
+        logger.debug("Handed %s's new connection from %s to the waiting session.", username, addr)
+        return
     # --- FIX: Allow reconnect if player is marked as disconnected in any waiting_reconnect game ---
     if mode == "2":
-        for game_key, game_state in games.items():
-            if (
-                username in game_key
-                and game_state.get('waiting_reconnect')
-                and not game_state['connected'][username]
-            ):
-                game_state['connected'][username] = True
-                game_state['conns'][username] = conn
-                game_state['addrs'][username] = addr
-                print(f"[INFO] {username} reconnected to existing game {game_key}.")
-                two_player_game(
-                    game_state['conns'][game_key[0]], game_state['addrs'][game_key[0]],
-                    game_state['conns'][game_key[1]], game_state['addrs'][game_key[1]],
-                    game_key[0], game_key[1]
-                )
-                return
+        game_key, game_state = _claim_reconnect(username, conn, addr)
+        if game_state is not None:
+            logger.info("%s reconnected to existing game %s.", username, game_key)
+            two_player_game(
+                game_state.conns[game_key[0]], game_state.addrs[game_key[0]],
+                game_state.conns[game_key[1]], game_state.addrs[game_key[1]],
+                game_key[0], game_key[1]
+            )
+            return
     # --- NEW: For single player, just play the game ---
     if mode == "1":
         single_player(conn, addr, username)
     else:
         with waiting_players_lock:
-            waiting_lines.append((conn, addr, username))
-            if game_running.is_set():
-                try:
-                    # Use protocol for lobby messages
-                    send_packet(conn, 0, PKT_TYPE_GAME, "A game is currently in progress. You are in the lobby and will join the next game when it starts.")
-                    send_packet(conn, 0, PKT_TYPE_GAME, "You can chat with 'chat <message>'.")
-                except Exception:
-                    print(f"[WARN] Failed to notify player at {addr}")
-            else:
-                try:
-                    send_packet(conn, 0, PKT_TYPE_GAME, "Waiting for another player to join...")
-                    send_packet(conn, 0, PKT_TYPE_GAME, "You can chat with 'chat <message>'.")
-                except Exception:
-                    print(f"[WARN] Failed to notify player at {addr}")
-        # Wait for the connection to close (i.e., after a game or disconnect)
-        try:
-            seq_recv = 0
-            while True:
-                if conn.fileno() == -1:
-                    # Connection closed
-                    with waiting_players_lock:
-                        if any(c == conn for c, _, _ in waiting_lines):
-                            print(f"[INFO] Player at {addr} ({username}) QUIT or disconnected while in the lobby.")
-                            waiting_lines[:] = [(c, a, u) for c, a, u in waiting_lines if c != conn]
-                    
-                    # Also remove from active_connections
-                    with active_connections_lock:
-                        if conn in active_connections:
-                            active_connections.remove(conn)
-                            print(f"[EVENT] Removed {addr} ({username}) from active_connections after disconnect")
-                    break
-                
-                with waiting_players_lock:
-                    # Only process if player is still in waiting_lines
-                    if not any(c == conn for c, _, _ in waiting_lines):
-                        # Player was moved to a game
-                        break
-                
-                # Poll for messages to handle chat while in lobby
-                try:
-                    conn.setblocking(False)
+            # Checked under the same lock as the insert, so concurrent joiners cannot overfill the lobby
+            lobby_full = len(waiting_lines) >= MAX_LOBBY_SIZE
+            if not lobby_full:
+                waiting_lines[username] = (conn, addr)
+                # Registered under the same lock as the append, so the player cannot be matched first
+                lobby_watch(conn, addr, username)
+                waiting_players_cv.notify_all()
+                if game_running.is_set():
                     try:
-                        readable, _, _ = select.select([conn], [], [], 0.5)
-                        if readable:
-                            try:
-                                seq, pkt_type, payload = recv_packet(conn)
-                                if pkt_type == PKT_TYPE_CHAT:
-                                    print(f"[EVENT] Received chat message from {username} in lobby: '{payload}'")
-                                    broadcast_chat(username, payload)
-                            except Exception as e:
-                                print(f"[EVENT] Exception receiving from lobby player {username}: {e}")
-                                # Player disconnected
-                                with waiting_players_lock:
-                                    waiting_lines[:] = [(c, a, u) for c, a, u in waiting_lines if c != conn]
-                                with active_connections_lock:
-                                    if conn in active_connections:
-                                        active_connections.remove(conn)
-                                        print(f"[EVENT] Removed {addr} ({username}) from active_connections after error")
-                                break
+                        # Use protocol for lobby messages
+                        send_bytes(conn, PKT_GAME_IN_PROGRESS)
+                        send_bytes(conn, PKT_CHAT_HINT)
                     except Exception:
-                        pass
-                finally:
+                        logger.warning("Failed to notify player at %s", addr)
+                else:
                     try:
-                        conn.setblocking(True)
+                        send_bytes(conn, PKT_WAITING_FOR_PLAYER)
+                        send_bytes(conn, PKT_CHAT_HINT)
                     except Exception:
-                        # Socket is likely closed
-                        break
-                
-                time.sleep(0.1) # Short sleep to prevent CPU thrashing
-                
-        except Exception as e:
-            print(f"[EVENT] Exception in game_manager lobby wait for {username}: {e}")
-            # Clean up if player disconnects
-            with waiting_players_lock:
-                waiting_lines[:] = [(c, a, u) for c, a, u in waiting_lines if c != conn]
-            with active_connections_lock:
-                if conn in active_connections:
-                    active_connections.remove(conn)
+                        logger.warning("Failed to notify player at %s", addr)
+        if lobby_full:
+            # Sent after releasing the lock, so a slow client does not hold up the lobby
+            logger.warning("Lobby full, turning away %s (%s)", addr, username)
+            try:
+                send_bytes(conn, PKT_LOBBY_FULL)
+            except Exception:
+                pass
+            discard_active_connections(conn)
+            conn.close()
+            return
+        # From here the lobby reactor reads this player's chat and lobby_manager matches them,
+        # so this handler returns and its pool thread and session slot are free for others
+
+def admit_client(conn, addr, mode):
+    """
+    Hands a new connection to the client pool if a session slot is free.
+    Otherwise the client is told the server is full and disconnected.
+    """
+    if not session_slots.acquire(blocking=False):
+        logger.warning("Server full (%s sessions), rejecting %s", MAX_SESSIONS, addr)
+        try:
+            send_bytes(conn, PKT_SERVER_FULL)
+        except Exception:
+            pass
+        conn.close()
+        return
+    client_executor.submit(handle_client, conn, addr, mode)
+
+def handle_client(conn, addr, mode):
+    """Runs game_manager for an admitted connection, then frees its session slot."""
+    try:
+        game_manager(conn, addr, mode)
+    except Exception:
+        # A pooled future would otherwise swallow the traceback
+        logger.exception("Client handler for %s crashed", addr)
+    finally:
+        session_slots.release()
+
+def lobby_watch(conn, addr, username):
+    """
+    Hand a waiting player's socket to the lobby reactor, which reads their chat until they
+    leave the lobby. Call with waiting_players_lock held, together with the waiting_lines insert.
+    """
+    with lobby_io_lock:
+        try:
+            lobby_selector.get_key(conn)
+            return  # Already in the lobby
+        except (KeyError, ValueError):
+            pass
+        try:
+            conn.setblocking(False)  # Stays non-blocking for the whole lobby stay
+            # Remembered in the selector key, so lobby_unwatch can give the game the size it had
+            sndbuf = conn.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) // _SNDBUF_REPORT_SCALE
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, LOBBY_SNDBUF)
+            lobby_selector.register(conn, selectors.EVENT_READ, (username, addr, sndbuf))
+        except (ValueError, OSError):
+            pass  # Socket already closed; lobby_manager purges it
+
+def lobby_unwatch(conn):
+    """Take a socket back from the lobby reactor, restoring blocking mode and its send buffer. Safe to repeat."""
+    with lobby_io_lock:
+        try:
+            _, _, sndbuf = lobby_selector.unregister(conn).data
+        except (KeyError, ValueError):
+            return
+        try:
+            conn.setblocking(True)
+            # Fixed at the pre-lobby size for the rest of the connection; autotuning stays off
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+        except OSError:
+            pass
+
+def lobby_requeue_front(conn, addr, username):
+    """Put a player back at the head of the lobby queue (e.g. the last game's winner). Call with waiting_players_lock held."""
+    waiting_lines[username] = (conn, addr)
+    waiting_lines.move_to_end(username, last=False)
+    lobby_watch(conn, addr, username)
+
+def _lobby_read(conn):
+    """
+    Read what has arrived on a non-blocking lobby socket into its rx buffer and return the
+    complete packets as (seq, pkt_type, payload) tuples. A partial packet stays buffered, and
+    so does anything left over when the player moves into a game. Raises ConnectionError on EOF.
+    """
+    buf = _rx_buffer(conn)
+    try:
+        _fill_rx_buffer(conn, buf)
+    except BlockingIOError:
+        pass  # Spurious wake-up; nothing new to read
+    packets = []
+    total = _packet_ready(buf)
+    while total:
+        packets.append(_pop_packet(buf, total))
+        total = _packet_ready(buf)
+    return packets
+
+def lobby_reactor():
+    """Read chat from every waiting player on one thread, dropping players whose socket fails."""
+    while True:
+        for key, _ in lobby_selector.select(0.5):
+            conn = key.fileobj
+            username, addr, _ = key.data
+            with lobby_io_lock:
+                if lobby_selector.get_map().get(key.fd) is not key:
+                    continue  # Left the lobby after select() returned
+                try:
+                    packets = _lobby_read(conn)
+                    failed = False
+                except Exception as e:
+                    logger.debug("Exception receiving from lobby player %s: %s", username, e)
+                    failed = True
+            if not failed:
+                for _, pkt_type, payload in packets:
+                    if pkt_type == PKT_TYPE_CHAT:
+                        logger.debug("Received chat message from %s in lobby: '%s'", username, payload)
+                        broadcast_chat(username, payload)
+                continue
+            # Player disconnected
+            lobby_unwatch(conn)
+            with waiting_players_cv:
+                if waiting_lines.get(username, (None,))[0] is conn:
+                    logger.info("Player at %s (%s) QUIT or disconnected while in the lobby.", addr, username)
+                    del waiting_lines[username]
+                    # Wake lobby_manager so a countdown involving this player is re-planned now
+                    waiting_players_cv.notify_all()
+            dead_connections.put(conn)
 
 def lobby_manager():
+    match_pair = None      # usernames of the match being counted down
+    match_start_at = None  # time.monotonic() at which that match starts
+    lobby_order = ()       # usernames in queue order when the status was last sent
+    status_sent = {}       # username -> (conn, encoded status) last sent to that player
+    # Locals for the per-player status loop, which runs for the whole lobby on every refresh
+    build = build_packet
+    restamp = restamp_packet
+    game_type = PKT_TYPE_GAME
+    reminder = PKT_LOBBY_CHAT_REMINDER
+    send = try_send_bytes
     while True:
-        with waiting_players_lock:
-            if len(waiting_lines) >= 2 and not game_running.is_set():
-                # Remove any closed/disconnected connections from waiting_lines
-                waiting_lines[:] = [(c, a, u) for (c, a, u) in waiting_lines if c.fileno() != -1]
-                winner_in_lobby = None
-                if len(waiting_lines) > 0:
-                    winner_in_lobby = waiting_lines[0]
-                if winner_in_lobby:
-                    if len(waiting_lines) > 1:
-                        next_opponent = waiting_lines[1]
-                        msg = (
-                            f"[LOBBY] Next match: {winner_in_lobby[1]} (last game winner) "
-                            f"vs {next_opponent[1]}. The match will begin in FIVE SECONDS."
-                        )
-                    else:
-                        msg = (
-                            f"[LOBBY] Next match: {winner_in_lobby[1]} (last game winner) "
-                            f"awaiting an opponent. The match will begin when another player joins."
-                        )
+        outbox = []  # (username, conn, addr, packet) built under the lock, sent after releasing it
+        with waiting_players_cv:
+            if len(waiting_lines) < 2:
+                match_pair = None  # The announced match fell apart; announce afresh when it re-forms
+            # Sleep until game_manager or a finished game changes the lobby, instead of polling
+            waiting_players_cv.wait_for(
+                lambda: server_stopping.is_set() or (len(waiting_lines) >= 2 and not game_running.is_set()))
+            if server_stopping.is_set():
+                return  # The pools are shutting down, so no new match may be submitted
+            # Remove any closed/disconnected connections from waiting_lines
+            for u, (c, a) in list(waiting_lines.items()):
+                if c.fileno() == -1:
+                    lobby_unwatch(c)
+                    del waiting_lines[u]
+            head_pair = tuple(islice(waiting_lines, 2))
+            order = tuple(waiting_lines)
+            if order != lobby_order:
+                # Someone joined, left or moved up: refresh the status of players it changed for
+                lobby_order = order
+                # The head of the queue is the last game's winner (requeued at the front)
+                if len(head_pair) == 2:
+                    (_, winner_addr), (_, opponent_addr) = islice(waiting_lines.values(), 2)
+                    msg = LOBBY_NEXT_MATCH.format(winner=winner_addr, opponent=opponent_addr)
+                elif head_pair:
+                    # The purge above left a single player, who waits for the next to join
+                    _, winner_addr = waiting_lines[head_pair[0]]
+                    msg = LOBBY_AWAITING_OPPONENT.format(winner=winner_addr)
                 else:
-                    if len(waiting_lines) >= 2:
-                        msg = (
-                            f"[LOBBY] Next match: {waiting_lines[0][1]} vs {waiting_lines[1][1]}. "
-                            "The match will begin in FIVE SECONDS."
-                        )
-                    elif len(waiting_lines) == 1:
-                        msg = (
-                            f"[LOBBY] Next match: {waiting_lines[0][1]} awaiting an opponent. "
-                            "The match will begin when another player joins."
-                        )
-                    else:
-                        msg = "[LOBBY] Waiting for players to join for the next match."
-                
-                print(f"[EVENT] Lobby status: {msg}")
-                
-                # Broadcast to all lobby clients, including their queue position
-                for idx, (conn, addr, username) in enumerate(waiting_lines):
-                    try:
-                        # Use protocol for lobby messages
-                        send_packet(conn, idx, PKT_TYPE_GAME, f"{msg}\n[LOBBY] You are position {idx+1} in the queue.")
-                        # Add a chat reminder message for lobby players
-                        # Remind players they can chat
-                        if len(waiting_lines) > 1:  # Only if there are other players to chat with
-                            send_packet(conn, idx, PKT_TYPE_GAME, "[LOBBY] Remember: You can chat with other players using 'chat <message>'")
-                    except Exception as e:
-                        print(f"[EVENT] Failed to send lobby message to {username} at {addr}: {e}")
-                        pass
+                    msg = LOBBY_EMPTY
+                if head_pair != match_pair:
+                    logger.info("Lobby status: %s", msg)
                 
-                # If we have enough players, start a game after a delay
-                if len(waiting_lines) >= 2:
-                    print("[EVENT] Starting game countdown...")
-                    time.sleep(5.0)
-                    # Check again after delay in case players disconnected
-                    if len(waiting_lines) >= 2:
-                        (conn1, addr1, username1) = waiting_lines.pop(0)
-                        (conn2, addr2, username2) = waiting_lines.pop(0)
-                        print(f"[INFO] Starting new two player game between {username1} and {username2}.")
-                        threading.Thread(target=two_player_game, args=(conn1, addr1, conn2, addr2, username1, username2), daemon=True).start()
-                        
-                        # Note: No need to add to active_connections here since we already added them when they connected
-        
-        threading.Event().wait(0.5) # Sleep the threaded game if no players
+                # Send each lobby client its status and queue position, unless it already has them
+                remind = len(waiting_lines) > 1  # Only remind about chat if there are other players to chat with
+                # Only the position differs per player, so the shared text is encoded once
+                status_prefix = f"{msg}\n[LOBBY] You are position ".encode('utf-8')
+                sent = {}
+                previous = status_sent.get
+                queue_send = outbox.append
+                for idx, (username, (conn, addr)) in enumerate(waiting_lines.items()):
+                    status = status_prefix + b"%d in the queue." % (idx + 1)
+                    sent[username] = (conn, status)
+                    if previous(username) == (conn, status):
+                        continue
+                    # Use protocol for lobby messages
+                    packet = build(idx, game_type, status)
+                    if remind:
+                        # Packets are length-prefixed, so the reminder rides in the same send
+                        packet += restamp(reminder, idx)
+                    queue_send((username, conn, addr, packet))
+                status_sent = sent
+            if len(head_pair) < 2:
+                match_pair = None  # Nothing to count down; the wait_for above sleeps until someone joins
+            else:
+                if head_pair != match_pair:
+                    # A new pairing: (re)start the countdown
+                    logger.info("Starting game countdown...")
+                    match_pair = head_pair
+                    match_start_at = time.monotonic() + MATCH_COUNTDOWN
+                remaining = match_start_at - time.monotonic()
+                if outbox:
+                    pass  # Deliver the status first; the next pass resumes the countdown
+                elif remaining > 0:
+                    # Count down with the lock released, so joins, leaves and chat carry on meanwhile.
+                    # Joins and leaves notify the cv, so a changed pairing is seen at once, not at the deadline.
+                    waiting_players_cv.wait(remaining)
+                else:
+                    match_pair = None
+                    username1, (conn1, addr1) = waiting_lines.popitem(last=False)
+                    username2, (conn2, addr2) = waiting_lines.popitem(last=False)
+                    # They will need a fresh status if they come back to the lobby after the game
+                    status_sent.pop(username1, None)
+                    status_sent.pop(username2, None)
+                    # Take both sockets back from the reactor before the game reads them
+                    lobby_unwatch(conn1)
+                    lobby_unwatch(conn2)
+                    logger.info("Starting new two player game between %s and %s.", username1, username2)
+                    game_running.set()  # Mark busy now so the next wait_for does not re-match
+                    supervisor_executor.submit(two_player_game, conn1, addr1, conn2, addr2, username1, username2)
+
+                # Note: No need to add to active_connections here since we already added them when they connected
+        # A slow client no longer holds up joins, leaves and the reactor while its status goes out
+        for username, conn, addr, packet in outbox:
+            try:
+                # Non-blocking, as in lobby_broadcast: a player whose buffer is full misses this update
+                send(conn, packet)
+            except Exception as e:
+                logger.warning("Failed to send lobby message to %s at %s: %s", username, addr, e)
+
+def setup_logging():
+    """
+    Send log records through a queue to a listener thread that owns the stdout handler,
+    so game and accept threads never block writing to the terminal.
+    Returns the started QueueListener.
+    """
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    listener.start()
+    return listener
+
+def _handshake_ready(conn):
+    """
+    Read what has arrived on a connection still owing its USERNAME packet. True once a complete
+    packet is buffered; handle_initial_connection then reads it without blocking.
+    Raises ConnectionError on EOF.
+    """
+    buf = _rx_buffer(conn)
+    try:
+        _fill_rx_buffer(conn, buf)
+    except BlockingIOError:
+        pass  # Spurious wake-up; nothing new to read
+    return _packet_ready(buf) != 0
+
+def _drop_pending(selector, conn, addr, reason):
+    """Forget a connection that never completed its handshake."""
+    selector.unregister(conn)
+    logger.info("Dropping %s before handshake: %s", addr, reason)
+    try:
+        conn.close()
+    except OSError:
+        pass
+
+def _held_client_sockets():
+    """Every client socket the server still holds: chat peers, the lobby, sessions and games."""
+    conns = set(active_connections)
+    with waiting_players_lock:
+        conns.update(c for c, a in waiting_lines.values())
+    with player_sessions_lock:
+        conns.update(s['conn'] for s in player_sessions.values() if s.get('conn') is not None)
+    with games_lock:
+        states = list(games.values())
+    for game_state in states:
+        with game_state.lock:
+            conns.update(c for c in game_state.conns.values() if c is not None)
+    return conns
+
+def shutdown_pool(executor, name):
+    """Cancel an executor's queued work and wait up to GAME_STOP_TIMEOUT for its running workers."""
+    stopper = threading.Thread(
+        target=executor.shutdown, kwargs={"wait": True, "cancel_futures": True}, daemon=True)
+    stopper.start()
+    stopper.join(GAME_STOP_TIMEOUT)
+    if stopper.is_alive():
+        logger.warning("%s pool did not stop within %ss.", name, GAME_STOP_TIMEOUT)
 
 def main():
+    # Every connection, game and helper thread gets this stack; must be set before any are started
+    threading.stack_size(THREAD_STACK_SIZE)
+    log_listener = setup_logging()
     mode = input ("Select mode: (1) Single player, (2) Two player: ").strip()
-    print(f"[INFO] Server listening on {HOST}:{PORT}")
+    logger.info("Server listening on %s:%s", HOST, PORT)
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
+        # Must precede bind, or a restart fails while the old port sits in TIME_WAIT
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.listen(10)
-        s.settimeout(1.0)
+        # Linux copies this to accepted sockets, so they are latency-tuned from the first byte
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.bind((HOST, PORT))
+        s.listen(socket.SOMAXCONN)
+        s.setblocking(False)
+        # One selector watches the listener and every connection that has not sent its username yet,
+        # so an idle or slow client costs a file descriptor rather than a parked handler thread
+        accept_selector = selectors.DefaultSelector()  # key.data: None for s, (addr, deadline) for a pending client
+        accept_selector.register(s, selectors.EVENT_READ)
+        accept_exhausted = False  # log fd exhaustion once per episode, not once per retry
         
         # Print instructions about chat feature
-        print("[INFO] Chat feature enabled. Players can chat by typing 'chat <message>'.")
-        print("[INFO] All connected players will receive chat messages, including those in the lobby.")
+        logger.info("Chat feature enabled. Players can chat by typing 'chat <message>'.")
+        logger.info("All connected players will receive chat messages, including those in the lobby.")
         
+        threading.Thread(target=chat_broadcaster, daemon=True).start()
+        threading.Thread(target=connection_sweeper, daemon=True).start()
+
         lobby_thread = None
         if mode == "2":
             lobby_thread = threading.Thread(target=lobby_manager)
             lobby_thread.daemon = True  # Make lobby thread a daemon so it doesn't block exit
             lobby_thread.start()
-        try:
-            while True:
+            threading.Thread(target=lobby_reactor, daemon=True).start()
+        # Signals only write to a self-pipe that the selector watches, so the loop needs no
+        # timeout just to notice Ctrl+C, and shutdown runs here rather than inside a handler
+        shutdown_r, shutdown_w = socket.socketpair()
+        shutdown_w.setblocking(False)
+        def request_shutdown(signum, frame):
+            try:
+                shutdown_w.send(bytes([signum]))
+            except OSError:
+                pass  # Pipe full; a shutdown is already pending
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, request_shutdown)
+        accept_selector.register(shutdown_r, selectors.EVENT_READ, "shutdown")
+        shutdown_signal = None
+        while shutdown_signal is None:
+            # Close connections that never sent their username, and sleep until the next deadline
+            now = time.monotonic()
+            next_deadline = None
+            for key in list(accept_selector.get_map().values()):
+                if isinstance(key.data, tuple):
+                    if key.data[1] <= now:
+                        _drop_pending(accept_selector, key.fileobj, key.data[0], "handshake timed out")
+                    elif next_deadline is None or key.data[1] < next_deadline:
+                        next_deadline = key.data[1]
+            timeout = None if next_deadline is None else next_deadline - now
+            for key, _ in accept_selector.select(timeout):
+                if key.data == "shutdown":
+                    shutdown_signal = signal.Signals(shutdown_r.recv(1)[0])
+                    break
+                if key.data is None:
+                    try:
+                        conn, addr = s.accept()
+                    except OSError as e:
+                        if e.errno in _ACCEPT_RETRY:
+                            continue  # Taken by another wake-up, or the client gave up first
+                        if e.errno not in _ACCEPT_EXHAUSTED:
+                            raise
+                        # The pending connection stays queued, so retrying at once would spin
+                        if not accept_exhausted:
+                            logger.error("Accept failed, backing off: %s", e)
+                            accept_exhausted = True
+                        time.sleep(ACCEPT_BACKOFF)
+                        continue
+                    accept_exhausted = False
+                    logger.info("Player connected from %s", addr)
+                    tune_socket(conn)
+                    conn.setblocking(False)
+                    accept_selector.register(conn, selectors.EVENT_READ, (addr, time.monotonic() + HANDSHAKE_TIMEOUT))
+                    continue
+                conn = key.fileobj
+                addr = key.data[0]
                 try:
-                    conn, addr = s.accept()
-                    print(f"[INFO] Player connected from {addr}")
-                    threading.Thread(target=game_manager, args=(conn, addr, mode), daemon=True).start()
-                except socket.timeout:
+                    ready = _handshake_ready(conn)
+                except OSError as e:
+                    _drop_pending(accept_selector, conn, addr, e)
                     continue
-                except Exception as e:
-                    print(f"[ERROR] Accept failed: {e}")
-        except KeyboardInterrupt:
-            print("\n[INFO] Server shutting down (Ctrl+C pressed).")
-            s.close()
-            # No join on daemon thread; process will exit immediately
-            return
+                if ready:
+                    accept_selector.unregister(conn)
+                    conn.setblocking(True)
+                    admit_client(conn, addr, mode)
+        # The self-pipe is not read any more, so a second Ctrl+C during shutdown kills the process
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, signal.SIG_DFL)
+        logger.info("Server shutting down (%s received).", shutdown_signal.name)
+        s.close()
+        for key in list(accept_selector.get_map().values()):
+            if isinstance(key.data, tuple):
+                _drop_pending(accept_selector, key.fileobj, key.data[0], "server shutting down")
+        accept_selector.close()
+        # Wake every parked pool worker: lobby_manager through its condition, game threads through
+        # their wake-up sockets, reconnect waits through their events, and reads by shutting down sockets
+        with waiting_players_cv:
+            server_stopping.set()
+            waiting_players_cv.notify_all()
+        with game_terminators_lock:
+            terminators = list(game_terminators)
+        for terminate in terminators:
+            terminate()
+        with player_sessions_lock:
+            for session in player_sessions.values():
+                session['reconnect_event'].set()
+        # Not just active_connections: the sweeper may have dropped a socket a worker still reads
+        for conn in _held_client_sockets():
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Already closed by its handler
+        # Games first, so their supervisors can finish, then the client handlers
+        shutdown_pool(game_executor, "Game")
+        shutdown_pool(supervisor_executor, "Supervisor")
+        shutdown_pool(client_executor, "Client")
+        shutdown_r.close()
+        shutdown_w.close()
+        log_listener.stop()
 
 # HINT: For multiple clients, you'd need to:
 # 1. Accept connections in a loop